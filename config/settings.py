@@ -164,6 +164,10 @@ CACHES = {
     }
 }
 
+ASYNC_CACHE_MAX_CONNECTIONS = config(
+    "ASYNC_CACHE_MAX_CONNECTIONS", default=20, cast=int
+)
+
 # FCM Django
 FCM_DJANGO_SETTINGS = {
     "FCM_SERVER_KEY": config("FCM_SERVER_KEY", default=""),
@@ -219,12 +223,43 @@ USE_L10N = True
 USE_TZ = True
 
 
+# Request Dispatch
+MATCHING_WINDOW = config("MATCHING_WINDOW", default=10, cast=float)
+MATCHING_MAX_WAIT = config("MATCHING_MAX_WAIT", default=120, cast=float)
+BROADCAST_DISPATCH_MAX_AGENTS = config(
+    "BROADCAST_DISPATCH_MAX_AGENTS", default=5, cast=int
+)
+REQUEST_EXPIRY_TIMEOUT = config("REQUEST_EXPIRY_TIMEOUT", default=60, cast=float)
+REQUEST_EXPIRY_SWEEP_INTERVAL = config(
+    "REQUEST_EXPIRY_SWEEP_INTERVAL", default=5, cast=float
+)
+REQUEST_EXPIRY_BATCH_SIZE = config("REQUEST_EXPIRY_BATCH_SIZE", default=1000, cast=int)
+
+
 # Celery Settings
 CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BROKER_URL = CELERY_RESULT_BACKEND = REDIS_CONNECTION_URL
+CELERY_BEAT_SCHEDULE = {
+    "evict-stale-online-users": {
+        "task": "evict_stale_online_users",
+        "schedule": 600.0,
+    },
+    "reconcile-busy-users": {
+        "task": "reconcile_busy_users",
+        "schedule": 300.0,
+    },
+    "match-queued-requests": {
+        "task": "match_queued_requests",
+        "schedule": MATCHING_WINDOW,
+    },
+    "expire-pending-requests": {
+        "task": "expire_pending_requests",
+        "schedule": REQUEST_EXPIRY_SWEEP_INTERVAL,
+    },
+}
 
 # VFD Settings
 VFD_BASE_URL = config("VFD_BASE_URL")
@@ -253,6 +288,93 @@ JWT_SETTINGS = {
 OSRM_BASE_URL = config("OSRM_BASE_URL", default="https://router.project-osrm.org")
 DISTANCE_MATRIX_KEY = config("DISTANCE_MATRIX_KEY")
 
+# Agent Search
+AGENT_SEARCH_RADIUS_IN_KM = config("AGENT_SEARCH_RADIUS_IN_KM", default=100, cast=float)
+AGENT_RANKING_TOP_K = config("AGENT_RANKING_TOP_K", default=10, cast=int)
+AGENT_RANKING_WEIGHTS = {
+    "distance": config("AGENT_RANKING_DISTANCE_WEIGHT", default=0.3, cast=float),
+    "eta": config("AGENT_RANKING_ETA_WEIGHT", default=0.3, cast=float),
+    "rating": config("AGENT_RANKING_RATING_WEIGHT", default=0.2, cast=float),
+    "volume": config("AGENT_RANKING_VOLUME_WEIGHT", default=0.1, cast=float),
+    "acceptance_rate": config(
+        "AGENT_RANKING_ACCEPTANCE_RATE_WEIGHT", default=0.1, cast=float
+    ),
+}
+AGENT_ACCEPTANCE_RATE_WINDOW_IN_DAYS = config(
+    "AGENT_ACCEPTANCE_RATE_WINDOW_IN_DAYS", default=30, cast=int
+)
+
+# Presence
+PRESENCE_WRITE_INTERVAL = config("PRESENCE_WRITE_INTERVAL", default=30, cast=float)
+PRESENCE_FLUSH_INTERVAL = config("PRESENCE_FLUSH_INTERVAL", default=1, cast=float)
+PRESENCE_FLUSH_BATCH_SIZE = config("PRESENCE_FLUSH_BATCH_SIZE", default=500, cast=int)
+
+# Token Revocation
+TOKEN_REVOCATION_BLOOM_FILTER = config(
+    "TOKEN_REVOCATION_BLOOM_FILTER", default=True, cast=bool
+)
+TOKEN_REVOCATION_BLOOM_CAPACITY = config(
+    "TOKEN_REVOCATION_BLOOM_CAPACITY", default=100000, cast=int
+)
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = config(
+    "TOKEN_REVOCATION_BLOOM_ERROR_RATE", default=0.01, cast=float
+)
+TOKEN_REVOCATION_BLOOM_REBUILD_INTERVAL = config(
+    "TOKEN_REVOCATION_BLOOM_REBUILD_INTERVAL", default=3600, cast=float
+)
+
+# User Cache
+USER_CACHE_TTL = config("USER_CACHE_TTL", default=60, cast=int)
+USER_CACHE_MAX_ENTRIES = config("USER_CACHE_MAX_ENTRIES", default=10000, cast=int)
+
+# Transaction Sessions
+TRANSACTION_SESSION_TTL = config("TRANSACTION_SESSION_TTL", default=86400, cast=int)
+
+# Location Updates
+LOCATION_UPDATE_MIN_INTERVAL = config(
+    "LOCATION_UPDATE_MIN_INTERVAL", default=1, cast=float
+)
+LOCATION_UPDATE_MIN_DISTANCE = config(
+    "LOCATION_UPDATE_MIN_DISTANCE", default=20, cast=float
+)
+LOCATION_ETA_REFRESH_INTERVAL = config(
+    "LOCATION_ETA_REFRESH_INTERVAL", default=15, cast=float
+)
+GEOFENCE_ENTER_RADIUS = config("GEOFENCE_ENTER_RADIUS", default=30, cast=float)
+GEOFENCE_EXIT_RADIUS = config("GEOFENCE_EXIT_RADIUS", default=60, cast=float)
+
+# Routing
+ROUTING_SEARCH_DEADLINE = config("ROUTING_SEARCH_DEADLINE", default=5, cast=float)
+ROUTING_TABLE_TIMEOUT = config("ROUTING_TABLE_TIMEOUT", default=2, cast=float)
+ROUTING_MAX_WORKERS = config("ROUTING_MAX_WORKERS", default=10, cast=int)
+ROUTING_ASYNC_MAX_CONNECTIONS = config(
+    "ROUTING_ASYNC_MAX_CONNECTIONS", default=100, cast=int
+)
+ROUTING_ASYNC_MAX_KEEPALIVE = config(
+    "ROUTING_ASYNC_MAX_KEEPALIVE", default=20, cast=int
+)
+ROUTE_CACHE_GEOHASH_PRECISION = config(
+    "ROUTE_CACHE_GEOHASH_PRECISION", default=7, cast=int
+)
+ROUTE_CACHE_TTL = config("ROUTE_CACHE_TTL", default=300, cast=int)
+ROUTE_CACHE_LOCAL_TTL = config("ROUTE_CACHE_LOCAL_TTL", default=60, cast=int)
+ROUTE_CACHE_LOCAL_MAX_ENTRIES = config(
+    "ROUTE_CACHE_LOCAL_MAX_ENTRIES", default=2048, cast=int
+)
+ROUTE_CACHE_MIN_DISTANCE = config("ROUTE_CACHE_MIN_DISTANCE", default=1000, cast=int)
+ROUTING_CIRCUIT_FAILURE_THRESHOLD = config(
+    "ROUTING_CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int
+)
+ROUTING_CIRCUIT_RESET_TIMEOUT = config(
+    "ROUTING_CIRCUIT_RESET_TIMEOUT", default=30, cast=float
+)
+ETA_FALLBACK_DETOUR_FACTOR = config(
+    "ETA_FALLBACK_DETOUR_FACTOR", default=1.3, cast=float
+)
+ETA_FALLBACK_AVERAGE_SPEED = config(
+    "ETA_FALLBACK_AVERAGE_SPEED", default=8.3, cast=float
+)
+
 
 # Sentry
 if ENV.lower() in ["production", "staging", "dev"]:
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentservice', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionpayments',
+            index=models.Index(fields=['transaction_reference', 'customer', 'payment_gateway'], name='txpay_ref_customer_gateway_idx'),
+        ),
+    ]
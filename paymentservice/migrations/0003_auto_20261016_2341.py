@@ -0,0 +1,23 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:41
+
+from django.db import migrations
+import utils.model_helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paymentservice', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            utils.model_helpers.drop_referencing_like_indexes('paymentservice.TransactionPayments'),
+            utils.model_helpers.restore_hex_ids('paymentservice.TransactionPayments'),
+        ),
+        migrations.AlterField(
+            model_name='transactionpayments',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -25,7 +25,11 @@ class TransactionPayments(BaseAbstractModel):
         indexes = [
             models.Index(
                 fields=["state", "payment_status", "transaction_reference"],
-            )
+            ),
+            models.Index(
+                name="txpay_ref_customer_gateway_idx",
+                fields=["transaction_reference", "customer", "payment_gateway"],
+            ),
         ]
 
     transaction = models.ForeignKey(
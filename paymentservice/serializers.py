@@ -2,10 +2,13 @@ from django.db.models import Q
 from django.utils.timezone import now
 from rest_framework import serializers
 from transactionservice.models import ExchangeTransactions
+from transactionservice.services import TransactionStatsService
 from utils.helpers import (
+    BusyUsersManager,
     CacheManager,
     ChannelManager,
     OnePipeProvider,
+    TransactionSessionManager,
     VDFAuth,
 )
 from utils.model_helpers import generate_id
@@ -143,13 +146,16 @@ class InitateEscrowSerializer(serializers.Serializer):
         )
 
         # Set Users(Customer and Agent) Stage in the Transaction
-        CacheManager.set_key(
-            f"{request_id}:" f"{self.exchange_transaction.agent_id}:stage",
-            "AWAITING_CASH_CONFIRMATION",
-        )
-        CacheManager.set_key(
-            f"{request_id}:" f"{self.exchange_transaction.customer_id}:stage",
-            "AWAITING_CASH_CONFIRMATION",
+        TransactionSessionManager.update_state(
+            request_id,
+            {
+                TransactionSessionManager.stage_field(
+                    self.exchange_transaction.agent_id
+                ): "AWAITING_CASH_CONFIRMATION",
+                TransactionSessionManager.stage_field(
+                    self.exchange_transaction.customer_id
+                ): "AWAITING_CASH_CONFIRMATION",
+            },
         )
 
         # Todo - Send a push notification to the agent
@@ -214,14 +220,12 @@ class FinalizeEscrowSerializer(serializers.Serializer):
         )
 
         # Set Users(Customer and Agent) Stage in the Transaction
-        transaction_group_name = f"transaction_{request_id}"
-        CacheManager.delete_keys(
-            f"{transaction_instance.agent_id}:stage",
-            f"{transaction_instance.customer_id}:stage",
-            f"{transaction_group_name}:customer_reached",
-            f"{transaction_group_name}:agent_reached",
-            f"request:{transaction_instance.request.request_id}",
+        TransactionSessionManager.delete_session(request_id)
+        TransactionStatsService.record_completed_transaction(transaction_instance)
+        BusyUsersManager.release(
+            transaction_instance.customer_id, transaction_instance.agent_id
         )
+        CacheManager.delete_key(f"request:{transaction_instance.request.request_id}")
         self.transaction_instance = transaction_instance
         return validated_data
 
@@ -278,14 +282,12 @@ class RevertEscrowSerializer(serializers.Serializer):
             channel=f"transaction_{request_id}", payload=event_payload
         )
 
-        transaction_group_name = f"transaction_{request_id}"
-        CacheManager.delete_keys(
-            f"{transaction_instance.agent_id}:stage",
-            f"{transaction_instance.customer_id}:stage",
-            f"{transaction_group_name}:customer_reached",
-            f"{transaction_group_name}:agent_reached",
-            f"request:{transaction_instance.request.request_id}",
+        TransactionSessionManager.delete_session(request_id)
+        TransactionStatsService.record_completed_transaction(transaction_instance)
+        BusyUsersManager.release(
+            transaction_instance.customer_id, transaction_instance.agent_id
         )
+        CacheManager.delete_key(f"request:{transaction_instance.request.request_id}")
         self.transaction_instance = transaction_instance
         return validated_data
 
@@ -388,13 +390,16 @@ class InitiateCardSerializer(serializers.Serializer):
         )
 
         # Set Users(Customer and Agent) Stage in the Transaction
-        CacheManager.set_key(
-            f"{request_id}:" f"{self.exchange_transaction.agent_id}:stage",
-            "AWAITING_CASH_CONFIRMATION",
-        )
-        CacheManager.set_key(
-            f"{request_id}:" f"{self.exchange_transaction.customer_id}:stage",
-            "AWAITING_CASH_CONFIRMATION",
+        TransactionSessionManager.update_state(
+            request_id,
+            {
+                TransactionSessionManager.stage_field(
+                    self.exchange_transaction.agent_id
+                ): "AWAITING_CASH_CONFIRMATION",
+                TransactionSessionManager.stage_field(
+                    self.exchange_transaction.customer_id
+                ): "AWAITING_CASH_CONFIRMATION",
+            },
         )
 
         return validated_data
@@ -448,15 +453,11 @@ class FinalizeCardSerializer(serializers.Serializer):
         )
 
         # Set Users(Customer and Agent) Stage in the Transaction
-        transaction_group_name = f"transaction_{request_id}"
-        CacheManager.delete_key(
-            f"{request_id}:" f"{transaction_instance.agent_id}:stage"
-        )
-        CacheManager.delete_key(
-            f"{request_id}:" f"{transaction_instance.customer_id}:stage"
+        TransactionSessionManager.delete_session(request_id)
+        TransactionStatsService.record_completed_transaction(transaction_instance)
+        BusyUsersManager.release(
+            transaction_instance.customer_id, transaction_instance.agent_id
         )
-        CacheManager.delete_key(f"{transaction_group_name}:agent_reached")
-        CacheManager.delete_key(f"{transaction_group_name}:customer_reached")
         CacheManager.delete_key(
             f"request:{transaction_instance.request.request_id}"
         )  # Deletes the search result
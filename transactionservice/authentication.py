@@ -2,7 +2,7 @@ from channels.auth import AuthMiddlewareStack
 from channels.db import database_sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from userservice.models import User
+from utils.helpers import UserCacheManager
 import jwt
 
 
@@ -11,7 +11,7 @@ def get_user(query_string):
     try:
         _, token_key = query_string.decode().split("=")
         payload = jwt.decode(token_key, settings.SECRET_KEY, algorithms=["HS256"])
-        user = User.objects.filter(id=payload["uid"]).first()
+        user = UserCacheManager.get_user(payload["uid"])
         return user or AnonymousUser()
     except Exception:
         return AnonymousUser()
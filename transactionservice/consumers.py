@@ -1,10 +1,21 @@
+import asyncio
 import json
-from asgiref.sync import async_to_sync, sync_to_async
+import time
+
+from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer, AsyncJsonWebsocketConsumer
+from django.conf import settings
 from django.db.models import Q
 from django.utils.timezone import datetime
 from sentry_sdk import capture_exception
-from utils.helpers import CacheManager, UserDistanceManager
+from utils.helpers import (
+    AsyncTransactionSessionManager,
+    BusyUsersManager,
+    GeoManager,
+    TransactionSessionManager,
+    UserDistanceManager,
+    UsersAvailabilityManager,
+)
 
 from transactionservice.models import ExchangeRequests, ExchangeTransactions
 from channels.db import database_sync_to_async
@@ -12,8 +23,24 @@ from channels.db import database_sync_to_async
 
 class TransactionConsumer(AsyncJsonWebsocketConsumer):
 
-    has_agent_arrived = None
-    has_customer_arrived = None
+    role = None
+    counterpart_role = None
+    counterpart_id = None
+    reached_field = None
+    identity_field = None
+
+    # Location frames arriving faster than this (in seconds) are coalesced
+    LOCATION_MIN_INTERVAL = settings.LOCATION_UPDATE_MIN_INTERVAL
+    # ETAs are recomputed only after moving this far (in meters) ...
+    LOCATION_MIN_DISTANCE = settings.LOCATION_UPDATE_MIN_DISTANCE
+    # ... or once this many seconds have passed since the last one
+    ETA_REFRESH_INTERVAL = settings.LOCATION_ETA_REFRESH_INTERVAL
+
+    pending_location_event = None
+    location_flush_task = None
+    last_location_flushed_at = 0.0
+    last_eta_coordinates = None
+    last_eta_computed_at = 0.0
 
     async def connect(self):
         self.request_id = self.scope["url_route"]["kwargs"]["request_id"]
@@ -39,12 +66,24 @@ class TransactionConsumer(AsyncJsonWebsocketConsumer):
             )
             return await self.close(1000)
 
+        await UsersAvailabilityManager.async_set_user_last_seen(self.user)
         await self.send_json(
             {"message": f"Connected to Request with ID->>{self.request_id}"}
         )
 
     async def disconnect(self, close_code):
         """ Leave transaction group """
+        if self.location_flush_task:
+            self.location_flush_task.cancel()
+        if self.role:
+            # Clear the registered channel unless a newer connection replaced it
+            channel_field = f"channel:{self.role}"
+            await AsyncTransactionSessionManager.compare_and_set(
+                self.request_id,
+                channel_field,
+                self.channel_name,
+                {channel_field: None},
+            )
         await self.channel_layer.group_discard(
             self.transaction_group_name, self.channel_name
         )
@@ -54,45 +93,41 @@ class TransactionConsumer(AsyncJsonWebsocketConsumer):
         try:
             event_name = event_dict.get("event")
             print("INCOMING_DATA>>>>", event_dict)
-            channel_data_params = {"type": None, "event_data": event_dict}
 
             # Handles Location Events
             if event_name == "user.location.updated":
-                computed_eta_data = await self._proprocess_eta_data(event_dict)
-                event_dict["computed_eta_data"] = computed_eta_data
-                channel_data_params["type"] = "handle_user_eta"
-                channel_data_params["event_data"] = event_dict
+                return await self._ingest_location(event_dict)
 
             # Handles Identity Events
             if event_name == "user.identity.customer:confirmed":
-                has_customer_arrived = CacheManager.retrieve_key(
-                    f"{self.transaction_group_name}:customer_reached"
+                return await self._confirm_identity(
+                    event_dict,
+                    "customer_reached",
+                    "customer_identity",
+                    "Customer has not reached the destination",
                 )
-                if not has_customer_arrived:
-                    return await self.send_json(
-                        {"message": "Customer has not reached the destination"}
-                    )
-                channel_data_params["type"] = "user_identity_update"
 
             if event_name == "user.identity.agent:confirmed":
-                has_agent_arrived = CacheManager.retrieve_key(
-                    f"{self.transaction_group_name}:agent_reached"
+                return await self._confirm_identity(
+                    event_dict,
+                    "agent_reached",
+                    "agent_identity",
+                    "Agent has not reached the destination",
                 )
-                if not has_agent_arrived:
-                    return await self.send_json(
-                        {"message": "Agent has not reached the destination"}
-                    )
-                channel_data_params["type"] = "user_identity_update"
 
             if event_name in [
                 "user.identity.customer:denied",
                 "user.identity.agent:denied",
             ]:
-                channel_data_params["type"] = "user_identity_update"
-
-            return await self.channel_layer.group_send(
-                self.transaction_group_name, channel_data_params
-            )
+                await self._cancel_transaction()
+                data_payload = {"event": "user.transaction.cancelled"}
+                await self._send_to_counterpart(
+                    data_payload, handler="transaction_closed"
+                )
+                # The counterpart's channel has been read, the session can go
+                await AsyncTransactionSessionManager.delete_session(self.request_id)
+                await self.send_json(data_payload)
+                return await self.close(1000)
 
         except Exception as e:
             capture_exception(e)
@@ -102,164 +137,194 @@ class TransactionConsumer(AsyncJsonWebsocketConsumer):
         event_data = event["event_data"]
         await self.send_json(event_data)
 
-    async def handle_user_eta(self, event):
-        try:
-            event_data = event["event_data"]
-            data_payload = event_data
-
-            has_agent_arrived = CacheManager.retrieve_key(
-                f"{self.transaction_group_name}:agent_reached"
+    async def transaction_event(self, event):
+        """ Delivers an event computed by the counterpart's consumer """
+        await self.send_json(event["event_data"])
+
+    async def transaction_closed(self, event):
+        """ Delivers the counterpart's closing event and ends this session """
+        await self.send_json(event["event_data"])
+        await self.close(1000)
+
+    async def _send_to_counterpart(
+        self, data_payload, session_state=None, handler="transaction_event"
+    ):
+        """ Delivers `data_payload` to the counterpart's connection only """
+        counterpart_field = f"channel:{self.counterpart_role}"
+        if session_state is None:
+            session_state = await AsyncTransactionSessionManager.get_state(
+                self.request_id, counterpart_field
             )
-
-            has_customer_arrived = CacheManager.retrieve_key(
-                f"{self.transaction_group_name}:customer_reached"
+        counterpart_channel = session_state.get(counterpart_field)
+        if counterpart_channel:
+            await self.channel_layer.send(
+                counterpart_channel, {"type": handler, "event_data": data_payload}
             )
 
-            if has_agent_arrived and has_customer_arrived:
-                data_payload["event"] = "user.location.both_reached"
-                return await self.send_json(data_payload)
-
-            current_coordinates = event_data.get("body")
-            eta_data = event_data.get("computed_eta_data")
-            context = event_data.get("context")
-            data_payload = {
-                "event": "user.location.updated",
-                "context": context,
-                "body": {
-                    "eta_data": eta_data,
-                    "current_lat": current_coordinates["lat"],
-                    "current_lon": current_coordinates["lon"],
-                },
-            }
-
-            if has_agent_arrived and context == "CUSTOMER":
-                data_payload["event"] = "user.location.reached"
-                return await self.send_json(data_payload)
-
-            if has_customer_arrived and context == "AGENT":
-                data_payload["event"] = "user.location.reached"
-                return await self.send_json(data_payload)
-
-            if eta_data and eta_data["distance_value"] <= 5:
-                if context == "CUSTOMER":
-                    data_payload["event"] = "user.location.reached"
-                    CacheManager.set_key(
-                        f"{self.request_id}:" f"{self.user.id}:stage",
-                        "AWAITING_IDENTITY_CONFIRMATION",
-                    )
-                    CacheManager.set_key(
-                        f"{self.transaction_group_name}:agent_reached", True
-                    )
-                    has_agent_arrived = True
-                elif context == "AGENT":
-                    CacheManager.set_key(
-                        f"{self.request_id}:" f"{self.user.id}:stage",
-                        "AWAITING_IDENTITY_CONFIRMATION",
-                    )
-                    CacheManager.set_key(
-                        f"{self.transaction_group_name}:customer_reached", True
-                    )
-                    data_payload["event"] = "user.location.reached"
-                    has_customer_arrived = True
-
-                if has_agent_arrived and has_customer_arrived:
-                    data_payload["event"] = "user.location.both_reached"
-                    return await self.send_json(data_payload)
+    async def _ingest_location(self, event_dict):
+        """ Coalesces bursts of location frames into one update per interval """
+        event_dict = self._latest_location_event(event_dict)
+        if not event_dict:
+            return
+        self.pending_location_event = event_dict
+
+        # A scheduled flush will pick up the latest pending point
+        if self.location_flush_task and not self.location_flush_task.done():
+            return
+
+        flush_delay = (
+            self.last_location_flushed_at
+            + self.LOCATION_MIN_INTERVAL
+            - time.monotonic()
+        )
+        if flush_delay <= 0:
+            return await self._flush_location()
+        self.location_flush_task = asyncio.ensure_future(
+            self._flush_location(flush_delay)
+        )
 
-            await self.send_json(data_payload)
+    async def _flush_location(self, delay=0):
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event_dict, self.pending_location_event = self.pending_location_event, None
+            self.last_location_flushed_at = time.monotonic()
+            if event_dict:
+                await self._process_location(
+                    event_dict, refresh_eta=self._should_refresh_eta(event_dict["body"])
+                )
         except Exception as e:
             capture_exception(e)
 
-    async def user_identity_update(self, event):
-        """ Handles User Identity Updates """
-        data_payload = {}
-
-        is_agent_confirmed = CacheManager.retrieve_key(
-            f"{self.transaction_group_name}:agent:identity"
+    async def _process_location(self, event_dict, refresh_eta=True):
+        """ Computes the location event once and delivers it to the counterpart """
+        current_coordinates = event_dict["body"]
+        await UsersAvailabilityManager.async_set_user_last_seen(
+            self.user,
+            latitude=current_coordinates["lat"],
+            longitude=current_coordinates["lon"],
         )
-
-        is_customer_confirmed = CacheManager.retrieve_key(
-            f"{self.transaction_group_name}:customer:identity"
+        session_state = await AsyncTransactionSessionManager.get_state(self.request_id)
+        destination_coordinates = session_state["destination_coordinates"]
+        has_user_arrived = bool(session_state.get(self.reached_field))
+        is_within_geofence = GeoManager.is_within_geofence(
+            current_coordinates["lat"],
+            current_coordinates["lon"],
+            destination_coordinates["lat"],
+            destination_coordinates["lon"],
+            was_inside=has_user_arrived,
         )
 
-        if all([is_agent_confirmed, is_customer_confirmed]):
-            data_payload["event"] = "user.identity.both_confirmed"
-            return await self.send_json(data_payload)
-
-        event_data = event["event_data"]
-        event_name = event_data["event"]
-        event_context = event_data.get("context")
-
-        if event_name == "user.identity.agent:confirmed":
-            CacheManager.set_key(
-                f"{self.request_id}:" f"{self.user.id}:stage",
-                "AWAITING_PAYMENT_INITIATION",
-            )
-            CacheManager.set_key(f"{self.transaction_group_name}:agent:identity", True)
-            is_agent_confirmed = True
-
-        if event_name == "user.identity.customer:confirmed":
-            CacheManager.set_key(
-                f"{self.request_id}:" f"{self.user.id}:stage",
-                "AWAITING_PAYMENT_INITIATION",
+        # Arrival is only undone before the user's identity is confirmed
+        is_identity_confirmed = session_state.get(self.identity_field)
+        has_arrival_changed = is_within_geofence != has_user_arrived and not (
+            has_user_arrived and is_identity_confirmed
+        )
+        if has_arrival_changed:
+            arrival_state = {self.reached_field: is_within_geofence}
+            if is_within_geofence:
+                arrival_state.update(
+                    self._stage_fields("AWAITING_IDENTITY_CONFIRMATION")
+                )
+            session_state = await AsyncTransactionSessionManager.update_state(
+                self.request_id, arrival_state
             )
-            CacheManager.set_key(
-                f"{self.transaction_group_name}:customer:identity", True
+            has_user_arrived = is_within_geofence
+
+        # Small moves since the last ETA only count when they change arrival
+        if not refresh_eta and not has_arrival_changed:
+            return
+
+        # Routing is only consulted for the ETA shown to the counterpart
+        eta_data = None
+        if not is_within_geofence:
+            eta_data = await UserDistanceManager.async_get_user_eta(
+                current_coordinates["lat"],
+                current_coordinates["lon"],
+                destination_coordinates["lat"],
+                destination_coordinates["lon"],
             )
-            is_customer_confirmed = True
 
-        if all([is_agent_confirmed, is_customer_confirmed]):
-            CacheManager.set_key(
-                f"{self.request_id}:" f"{self.user.id}:stage",
-                "AWAITING_PAYMENT_INITIATION",
-            )
-            data_payload["event"] = "user.identity.both_confirmed"
-            return await self.send_json(data_payload)
-
-        if event_name in [
-            "user.identity.customer:denied",
-            "user.identity.agent:denied",
-        ]:
-            data_payload = {
-                "event": "user.transaction.cancelled",
-            }
+        data_payload = {
+            "event": "user.location.updated",
+            "context": self.counterpart_role,
+            "body": {
+                "eta_data": eta_data,
+                "current_lat": current_coordinates["lat"],
+                "current_lon": current_coordinates["lon"],
+            },
+        }
+        if has_user_arrived:
+            data_payload["event"] = "user.location.reached"
+        if session_state.get("agent_reached") and session_state.get("customer_reached"):
+            data_payload["event"] = "user.location.both_reached"
+
+        # Arrival changes are state transitions, so the sender is told as well
+        await self._send_to_counterpart(data_payload, session_state)
+        if has_arrival_changed:
             await self.send_json(data_payload)
-            await self._cancel_transaction(event_context)
-            return await self.close(1000)
-
-        await self.send_json(event_data)
-
-    async def _proprocess_eta_data(self, event_data):
-        # Todo - Add condition to prevent redundant calls when user has reached
-        destination_coordinates = CacheManager.retrieve_key(
-            f"{self.request_id}:destination_coordinates"
-        )
-        current_coordinates = event_data.get("body")
-        context = event_data.get("context")
-
-        has_agent_arrived = CacheManager.retrieve_key(
-            f"{self.transaction_group_name}:agent_reached"
-        )
-
-        has_customer_arrived = CacheManager.retrieve_key(
-            f"{self.transaction_group_name}:customer_reached"
-        )
 
-        if has_agent_arrived and context == "CUSTOMER":
+    @staticmethod
+    def _latest_location_event(event_dict):
+        """ Reduces a single or batched (`points`) frame to its latest point """
+        location_body = event_dict.get("body") or {}
+        location_points = location_body.get("points") or [location_body]
+        latest_point = location_points[-1]
+        if latest_point.get("lat") is None or latest_point.get("lon") is None:
             return None
+        return {**event_dict, "body": latest_point}
+
+    def _should_refresh_eta(self, current_coordinates):
+        current_time = time.monotonic()
+        latitude = float(current_coordinates["lat"])
+        longitude = float(current_coordinates["lon"])
+        if (
+            self.last_eta_coordinates
+            and current_time - self.last_eta_computed_at < self.ETA_REFRESH_INTERVAL
+            and GeoManager.haversine_distance(
+                latitude, longitude, *self.last_eta_coordinates
+            )
+            < self.LOCATION_MIN_DISTANCE
+        ):
+            return False
+        self.last_eta_coordinates = (latitude, longitude)
+        self.last_eta_computed_at = current_time
+        return True
+
+    async def _confirm_identity(
+        self, event_dict, reached_field, identity_field, not_reached_message
+    ):
+        """ Records an identity confirmation only once the user has arrived """
+        (
+            is_confirmed,
+            session_state,
+        ) = await AsyncTransactionSessionManager.compare_and_set(
+            self.request_id,
+            reached_field,
+            True,
+            {
+                identity_field: True,
+                **self._stage_fields("AWAITING_PAYMENT_INITIATION"),
+            },
+        )
+        if not is_confirmed:
+            return await self.send_json({"message": not_reached_message})
 
-        if has_customer_arrived and context == "AGENT":
-            return None
+        data_payload = event_dict
+        if session_state.get("agent_identity") and session_state.get(
+            "customer_identity"
+        ):
+            data_payload = {"event": "user.identity.both_confirmed"}
 
-        # Call me only when the user triggering this hasn't arrived
-        computed_eta_data = await sync_to_async(UserDistanceManager.get_user_eta)(
-            current_coordinates.get("lat"),
-            current_coordinates.get("lon"),
-            destination_coordinates.get("lat"),
-            destination_coordinates.get("lon"),
-        )
+        await self._send_to_counterpart(data_payload, session_state)
+        await self.send_json(data_payload)
 
-        return computed_eta_data
+    def _stage_fields(self, stage):
+        """ Sets the same transaction stage for both participants """
+        return {
+            AsyncTransactionSessionManager.stage_field(self.user.id): stage,
+            AsyncTransactionSessionManager.stage_field(self.counterpart_id): stage,
+        }
 
     @database_sync_to_async
     def _is_transaction_member(self, request_id, user_instance):
@@ -270,10 +335,22 @@ class TransactionConsumer(AsyncJsonWebsocketConsumer):
             Q(customer=user_instance) | Q(agent=user_instance), id=request_id
         ).first()
         if accepted_request:
-            CacheManager.set_key(
-                f"{request_id}:destination_coordinates",
-                accepted_request.request_meta["destination_coordinates"],
-                timeout=86400,
+            is_agent = accepted_request.agent_id == user_instance.id
+            self.role = "AGENT" if is_agent else "CUSTOMER"
+            self.counterpart_role = "CUSTOMER" if is_agent else "AGENT"
+            self.counterpart_id = (
+                accepted_request.customer_id if is_agent else accepted_request.agent_id
+            )
+            self.reached_field = f"{self.role.lower()}_reached"
+            self.identity_field = f"{self.role.lower()}_identity"
+            TransactionSessionManager.update_state(
+                request_id,
+                {
+                    "destination_coordinates": accepted_request.request_meta[
+                        "destination_coordinates"
+                    ],
+                    f"channel:{self.role}": self.channel_name,
+                },
             )
             allow_entry = True
 
@@ -283,22 +360,24 @@ class TransactionConsumer(AsyncJsonWebsocketConsumer):
         ).exists()
 
         if is_exchange_cancelled:
-            CacheManager.delete_key(f"{request_id}:destination_coordinates")
+            TransactionSessionManager.delete_session(request_id)
             allow_entry = False
 
         return allow_entry
 
     @database_sync_to_async
-    def _cancel_transaction(self, event_context):
+    def _cancel_transaction(self):
         transaction_instance = ExchangeTransactions.objects.filter(
             transaction_status="IN-PROGRESS", request_id=self.request_id
         ).first()
         if transaction_instance:
-            close_initiator = "AGENT" if event_context == "CUSTOMER" else "CUSTOMER"
             transaction_instance.update(
-                cancellation_reason=f"{close_initiator} cancelled. Identity Mismatch",
+                cancellation_reason=f"{self.role} cancelled. Identity Mismatch",
                 closed_at=datetime.now(),
-                closed_by=close_initiator,
+                closed_by=self.role,
                 transaction_status="CANCELLED",
             )
+            BusyUsersManager.release(
+                transaction_instance.customer_id, transaction_instance.agent_id
+            )
         return transaction_instance
@@ -0,0 +1,61 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+from utils.model_helpers import generate_id
+
+# Label, column type and id generator of each primary key layout
+PRIMARY_KEY_LAYOUTS = [
+    ("uuid4 hex varchar", "varchar(60)", lambda: uuid.uuid4().hex),
+    ("uuid7 hex varchar", "varchar(60)", generate_id),
+    ("uuid7 native uuid", "uuid", generate_id),
+]
+
+
+class Command(BaseCommand):
+    help = "Compares insert throughput and index size of primary key layouts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark only runs against Postgres")
+
+        for label, column_type, id_generator in PRIMARY_KEY_LAYOUTS:
+            rows_per_second, index_size = self.benchmark_layout(
+                column_type, id_generator, options["rows"], options["batch_size"]
+            )
+            self.stdout.write(
+                f"{label:<20} {rows_per_second:>12,.0f} rows/s "
+                f"{index_size / 1024 / 1024:>10,.1f} MB primary key index"
+            )
+
+    @staticmethod
+    def benchmark_layout(column_type, id_generator, rows, batch_size):
+        # Temporary tables vanish with the transaction, leaving nothing behind
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE benchmark_primary_keys "
+                f"(id {column_type} PRIMARY KEY, created_at timestamptz NOT NULL) "
+                "ON COMMIT DROP"
+            )
+            started_at = time.perf_counter()
+            for inserted in range(0, rows, batch_size):
+                execute_values(
+                    cursor.cursor,
+                    "INSERT INTO benchmark_primary_keys VALUES %s",
+                    [
+                        (id_generator(),)
+                        for _ in range(min(batch_size, rows - inserted))
+                    ],
+                    template="(%s, now())",
+                    page_size=batch_size,
+                )
+            elapsed = time.perf_counter() - started_at
+            cursor.execute("SELECT pg_indexes_size('benchmark_primary_keys')")
+            index_size = cursor.fetchone()[0]
+        return rows / elapsed, index_size
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from transactionservice.services import TransactionStatsService
+
+
+class Command(BaseCommand):
+    help = "Recomputes every user's transaction statistics from scratch"
+
+    def handle(self, *args, **options):
+        rebuilt_count = TransactionStatsService.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt transaction stats for {rebuilt_count} user(s)")
+        )
@@ -0,0 +1,78 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+import utils.model_helpers
+
+
+def populate_user_transaction_stats(apps, schema_editor):
+    ExchangeTransactions = apps.get_model('transactionservice', 'ExchangeTransactions')
+    TransactionUserRatings = apps.get_model('transactionservice', 'TransactionUserRatings')
+    UserTransactionStats = apps.get_model('transactionservice', 'UserTransactionStats')
+    user_stats = {}
+
+    def stats_for(user_id):
+        return user_stats.setdefault(user_id, UserTransactionStats(user_id=user_id))
+
+    completed_transactions = ExchangeTransactions.objects.filter(
+        state='active', transaction_status='COMPLETED'
+    ).order_by()
+    for agent_stats in completed_transactions.values('agent').annotate(
+        txn_count=Count('id'), txn_volume=Sum('request_amount') + Sum('request_fees')
+    ):
+        stats = stats_for(agent_stats['agent'])
+        stats.agent_txn_count = agent_stats['txn_count']
+        stats.agent_txn_volume = agent_stats['txn_volume']
+
+    for customer_stats in completed_transactions.values('customer').annotate(
+        txn_count=Count('id'), txn_volume=Sum('request_amount')
+    ):
+        stats = stats_for(customer_stats['customer'])
+        stats.customer_txn_count = customer_stats['txn_count']
+        stats.customer_txn_volume = customer_stats['txn_volume']
+
+    for rating_stats in TransactionUserRatings.objects.filter(
+        state='active'
+    ).order_by().values('rated_user').annotate(
+        ratings_count=Count('id'), ratings_total=Sum('user_rating')
+    ):
+        stats = stats_for(rating_stats['rated_user'])
+        stats.ratings_count = rating_stats['ratings_count']
+        stats.ratings_total = rating_stats['ratings_total']
+
+    UserTransactionStats.objects.bulk_create(user_stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactionservice', '0006_auto_20210205_1512'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTransactionStats',
+            fields=[
+                ('id', models.CharField(default=utils.model_helpers.generate_id, editable=False, max_length=60, primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('active', 'active'), ('archived', 'archived'), ('deleted', 'deleted')], default='active', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agent_txn_count', models.PositiveIntegerField(default=0)),
+                ('agent_txn_volume', models.BigIntegerField(default=0)),
+                ('customer_txn_count', models.PositiveIntegerField(default=0)),
+                ('customer_txn_volume', models.BigIntegerField(default=0)),
+                ('ratings_count', models.PositiveIntegerField(default=0)),
+                ('ratings_total', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'UserTransactionStats',
+            },
+        ),
+        migrations.RunPython(
+            populate_user_transaction_stats, migrations.RunPython.noop
+        ),
+    ]
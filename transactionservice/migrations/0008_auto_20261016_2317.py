@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactionservice', '0007_usertransactionstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchangerequests',
+            name='request_status',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('ACCEPTED', 'ACCEPTED'), ('DECLINED', 'DECLINED'), ('EXPIRED', 'EXPIRED')], default='PENDING', max_length=20),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactionservice', '0008_auto_20261016_2317'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchangerequests',
+            index=models.Index(condition=models.Q(state='active'), fields=['agent', 'request_status', '-created_at', '-id'], name='exreq_agent_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangerequests',
+            index=models.Index(condition=models.Q(state='active'), fields=['request_id', 'request_status'], name='exreq_search_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangetransactions',
+            index=models.Index(condition=models.Q(state='active'), fields=['agent', 'transaction_status', '-created_at', '-id'], name='extxn_agent_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangetransactions',
+            index=models.Index(condition=models.Q(state='active'), fields=['customer', 'transaction_status', '-created_at', '-id'], name='extxn_cust_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangetransactions',
+            index=models.Index(condition=models.Q(state='active'), fields=['request', 'transaction_status'], name='extxn_request_status_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:41
+
+from django.db import migrations
+import utils.model_helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactionservice', '0010_auto_20261016_2336'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            utils.model_helpers.drop_referencing_like_indexes('transactionservice.ExchangeRequests', 'transactionservice.ExchangeTransactions', 'transactionservice.TransactionUserRatings', 'transactionservice.UserTransactionStats'),
+            utils.model_helpers.restore_hex_ids('transactionservice.ExchangeRequests', 'transactionservice.ExchangeTransactions', 'transactionservice.TransactionUserRatings', 'transactionservice.UserTransactionStats'),
+        ),
+        migrations.AlterField(
+            model_name='exchangerequests',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='exchangetransactions',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='transactionuserratings',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='usertransactionstats',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
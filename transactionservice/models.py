@@ -1,5 +1,6 @@
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
 
 # from userservice.models import User
 from django.conf import settings
@@ -42,6 +43,8 @@ class ExchangeRequests(BaseAbstractModel):
         ("PENDING", "PENDING"),
         ("ACCEPTED", "ACCEPTED"),
         ("DECLINED", "DECLINED"),
+        ("EXPIRED", "EXPIRED"),
+        ("WITHDRAWN", "WITHDRAWN"),
     ]
 
     request_status = models.CharField(
@@ -72,7 +75,18 @@ class ExchangeRequests(BaseAbstractModel):
         indexes = [
             models.Index(
                 fields=["state", "request_status", "request_id"],
-            )
+            ),
+            # Partial indexes only cover the rows BaseManager can return
+            models.Index(
+                name="exreq_agent_status_created_idx",
+                fields=["agent", "request_status", "-created_at", "-id"],
+                condition=Q(state="active"),
+            ),
+            models.Index(
+                name="exreq_search_status_idx",
+                fields=["request_id", "request_status"],
+                condition=Q(state="active"),
+            ),
         ]
 
     objects = BaseManager()
@@ -164,7 +178,22 @@ class ExchangeTransactions(BaseAbstractModel):
         indexes = [
             models.Index(
                 fields=["state", "transaction_status"],
-            )
+            ),
+            models.Index(
+                name="extxn_agent_status_created_idx",
+                fields=["agent", "transaction_status", "-created_at", "-id"],
+                condition=Q(state="active"),
+            ),
+            models.Index(
+                name="extxn_cust_status_created_idx",
+                fields=["customer", "transaction_status", "-created_at", "-id"],
+                condition=Q(state="active"),
+            ),
+            models.Index(
+                name="extxn_request_status_idx",
+                fields=["request", "transaction_status"],
+                condition=Q(state="active"),
+            ),
         ]
 
     objects = BaseManager()
@@ -204,3 +233,44 @@ class TransactionUserRatings(BaseAbstractModel):
 
     def __repr__(self):
         return f"TransactionUserRatings>>>{self.transaction.id}"
+
+
+class UserTransactionStats(BaseAbstractModel):
+    """ Running totals of a user's completed transactions and received ratings """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="transaction_stats",
+    )
+    agent_txn_count = models.PositiveIntegerField(default=0)
+    agent_txn_volume = models.BigIntegerField(default=0)
+    customer_txn_count = models.PositiveIntegerField(default=0)
+    customer_txn_volume = models.BigIntegerField(default=0)
+    ratings_count = models.PositiveIntegerField(default=0)
+    ratings_total = models.PositiveIntegerField(default=0)
+
+    objects = BaseManager()
+
+    class Meta:
+        db_table = "UserTransactionStats"
+
+    @property
+    def total_transactions(self):
+        return self.agent_txn_count + self.customer_txn_count
+
+    @property
+    def total_volume(self):
+        return self.agent_txn_volume + self.customer_txn_volume
+
+    @property
+    def avg_ratings(self):
+        if not self.ratings_count:
+            return 0
+        return self.ratings_total / self.ratings_count
+
+    def __str__(self):
+        return f"UserTransactionStats >>> {self.user_id}"
+
+    def __repr__(self):
+        return f"UserTransactionStats >>> {self.user_id}"
@@ -3,27 +3,34 @@ import json
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from django.db.models import Q
-from django.db.models.functions import Coalesce
-from django.db.models import Avg
 from django.utils.timezone import datetime
 from rest_framework import serializers
 from userservice.models import User
 from utils.constants import MAX_REQUEST_VALUE, MIN_REQUEST_VALUE
 from utils.helpers import (
+    BusyUsersManager,
     CacheManager,
+    MatchingManager,
+    RequestExpiryManager,
     UserDistanceManager,
     UsersAvailabilityManager,
     ChannelManager,
+    TransactionSessionManager,
 )
 from utils.model_helpers import generate_id
+from utils.serializer_helpers import BatchCacheListSerializer, BatchCacheMixin
 
 from transactionservice.models import (
     ExchangeRequests,
     ExchangeTransactions,
     TransactionUserRatings,
 )
+from transactionservice.services import DispatchService, TransactionStatsService
+from transactionservice.tasks import send_request_invites
 
 channel_layer = get_channel_layer()
 
@@ -72,9 +79,7 @@ class AgentsSerializer(serializers.ModelSerializer):
         )
 
     def get_ratings(self, obj):
-        # Omo x100000
-        user_ratings = obj.rated_user.aggregate(average=Coalesce(Avg("user_rating"), 0))
-        return user_ratings["average"]
+        return TransactionStatsService.get_user_stats(obj).avg_ratings
 
 
 class InitiateRequestSerializer(GetRequestFeesSerializer):
@@ -84,8 +89,15 @@ class InitiateRequestSerializer(GetRequestFeesSerializer):
     def validate(self, validated_data):
         requester_id = self.context["user"].id
         destination_coordinates = validated_data["destination_coordinates"]
-        online_user_ids = UsersAvailabilityManager.get_online_users_ids()
-        if online_user_ids is None:
+        online_user_ids = UsersAvailabilityManager.get_online_users_ids_within(
+            destination_coordinates["lat"],
+            destination_coordinates["lon"],
+            settings.AGENT_SEARCH_RADIUS_IN_KM,
+        )
+        online_user_ids = BusyUsersManager.filter_available(
+            [user_id for user_id in online_user_ids if user_id != requester_id]
+        )
+        if not online_user_ids:
             raise serializers.ValidationError(
                 {
                     "destination_coordinates": [
@@ -93,14 +105,10 @@ class InitiateRequestSerializer(GetRequestFeesSerializer):
                     ]
                 }
             )
-        online_user_ids.remove(requester_id)
 
-        busy_user_ids = ExchangeTransactions.objects.filter(
-            transaction_status="IN-PROGRESS"
-        ).values_list("customer", "agent")
         users_queryset = User.objects.filter(
             id__in=online_user_ids, account_type="Agent"
-        ).exclude(id__in=list(busy_user_ids))
+        )
 
         agents_info = UserDistanceManager.get_all_users_eta(
             destination_coordinates["lat"],
@@ -151,6 +159,8 @@ class DispatchRequestSerializer(serializers.Serializer):
         cached_request = CacheManager.retrieve_key(f"request:{request_search_id}")
         if cached_request is None:
             raise serializers.ValidationError("This request does not exist")
+        if DispatchService.has_winner(request_search_id):
+            raise serializers.ValidationError("This request has already been accepted")
         setattr(self, "cached_request", json.loads(cached_request))
         return request_search_id
 
@@ -184,53 +194,135 @@ class DispatchRequestSerializer(serializers.Serializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        customer = self.context["user"]
-        agent = self.agent_instance
-        created_request = ExchangeRequests.objects.create(
-            agent=agent,
-            customer=customer,
-            request_id=self.cached_request["request_search_id"],
-            request_meta=self.cached_request,
+        created_request = DispatchService.dispatch_request(
+            self.context["user"], self.agent_instance, self.cached_request
         )
         rep["request_id"] = created_request.id
 
-        # Send a Push Notification to the Agent
-        request_amount = "{:,.2f}".format(self.cached_request["request_amount"] / 100)
-        agent.send_push_notification(
-            title="New Cash Exchange Request",
-            body=f"{customer.first_name} is requesting a cash excahange of N{request_amount}",
-            context={"request_id": created_request.id, "type": "NEW_REQUEST_INVITE"},
+        return rep
+
+
+class BroadcastRequestSerializer(serializers.Serializer):
+    request_search_id = serializers.CharField()
+    agents_count = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.BROADCAST_DISPATCH_MAX_AGENTS,
+        default=settings.BROADCAST_DISPATCH_MAX_AGENTS,
+    )
+
+    def validate_request_search_id(self, request_search_id):
+        cached_request = CacheManager.retrieve_key(f"request:{request_search_id}")
+        if cached_request is None:
+            raise serializers.ValidationError("This request does not exist")
+        cached_request = json.loads(cached_request)
+        if cached_request["customer_info"]["id"] != self.context["user"].id:
+            raise serializers.ValidationError("This request does not exist")
+        if DispatchService.has_winner(request_search_id):
+            raise serializers.ValidationError("This request has already been accepted")
+        setattr(self, "cached_request", cached_request)
+        return request_search_id
+
+    def validate(self, validated_data):
+        cached_request = self.cached_request
+        already_dispatched_ids = set(
+            ExchangeRequests.objects.filter(
+                request_id=cached_request["request_search_id"]
+            ).values_list("agent_id", flat=True)
+        )
+        # Search results are ordered best agent first
+        candidate_ids = [
+            agent_data["user_data"]["id"]
+            for agent_data in cached_request["agents_info"]
+            if agent_data["user_data"]["id"] not in already_dispatched_ids
+        ]
+        available_ids = set(BusyUsersManager.filter_available(candidate_ids))
+        agent_ids = [
+            agent_id for agent_id in candidate_ids if agent_id in available_ids
+        ][: validated_data["agents_count"]]
+        if not agent_ids:
+            raise serializers.ValidationError(
+                {"request_search_id": ["There are no available agents to dispatch to"]}
+            )
+        agents = User.objects.in_bulk(agent_ids)
+        setattr(
+            self,
+            "agents",
+            [agents[agent_id] for agent_id in agent_ids if agent_id in agents],
         )
+        return validated_data
 
+    def to_representation(self, instance):
+        rep = super().to_representation(instance)
+        created_requests = DispatchService.broadcast_request(
+            self.context["user"], self.agents, self.cached_request
+        )
+        request_ids = [created_request.id for created_request in created_requests]
+        send_request_invites.delay(request_ids=request_ids)
+        rep["request_ids"] = request_ids
         return rep
 
 
-class ExchangeRequestsSerializer(serializers.ModelSerializer):
+class AutoMatchRequestSerializer(serializers.Serializer):
+    request_search_id = serializers.CharField()
+
+    def validate_request_search_id(self, request_search_id):
+        cached_request = CacheManager.retrieve_key(f"request:{request_search_id}")
+        if cached_request is None:
+            raise serializers.ValidationError("This request does not exist")
+        cached_request = json.loads(cached_request)
+        if cached_request["customer_info"]["id"] != self.context["user"].id:
+            raise serializers.ValidationError("This request does not exist")
+        return request_search_id
+
+    def validate(self, validated_data):
+        MatchingManager.enqueue(validated_data["request_search_id"])
+        return validated_data
+
+    def to_representation(self, instance):
+        rep = super().to_representation(instance)
+        rep["status"] = "QUEUED"
+        return rep
+
+
+class ExchangeRequestsSerializer(BatchCacheMixin, serializers.ModelSerializer):
     request_meta = serializers.SerializerMethodField()
 
     class Meta:
         model = ExchangeRequests
         fields = "__all__"
+        list_serializer_class = BatchCacheListSerializer
+
+    def fetch_cached_values(self, instances) -> dict:
+        # Only requests saved without their search results fall back to the cache
+        cache_keys = {
+            instance.pk: f"request:{instance.request_id}"
+            for instance in instances
+            if not instance.request_meta
+        }
+        cached_requests = CacheManager.retrieve_keys(list(set(cache_keys.values())))
+        return {
+            pk: json.loads(cached_requests[cache_key])
+            if cached_requests.get(cache_key)
+            else None
+            for pk, cache_key in cache_keys.items()
+        }
 
     def get_request_meta(self, instance):
-        cached_request = CacheManager.retrieve_key(f"request:{instance.request_id}")
-        if cached_request:
-            cached_request = json.loads(cached_request)
-        request_meta = instance.request_meta or cached_request
+        request_meta = instance.request_meta or self.get_cached_value(instance)
         if not request_meta:
             return None
         request_meta = dict(
             request_id=instance.id,
-            request_amount=instance.request_meta["request_amount"],
-            fees=instance.request_meta["fees"],
-            my_data=instance.request_meta["agents_info"][0]["user_data"],
-            eta_detail=instance.request_meta["agents_info"][0]["distance_details"],
-            requested_at=instance.request_meta["agents_info"][0]["requested_at"],
-            destination_street_name=instance.request_meta["agents_info"][0][
+            request_amount=request_meta["request_amount"],
+            fees=request_meta["fees"],
+            my_data=request_meta["agents_info"][0]["user_data"],
+            eta_detail=request_meta["agents_info"][0]["distance_details"],
+            requested_at=request_meta["agents_info"][0]["requested_at"],
+            destination_street_name=request_meta["agents_info"][0][
                 "destination_street_name"
             ],
-            customer_info=instance.request_meta["customer_info"],
-            destination_coordinates=instance.request_meta["destination_coordinates"],
+            customer_info=request_meta["customer_info"],
+            destination_coordinates=request_meta["destination_coordinates"],
         )
         return request_meta
 
@@ -265,6 +357,7 @@ class HandleRequestNotificationSerializer(serializers.Serializer):
                 channel=f"transaction_{request_id}", payload=event_payload
             )
             request_instance.update(request_status=reaction)
+            RequestExpiryManager.cancel(request_instance.id)
             # Todo - Send Notification to the requester{request_instance.user}
             return validated_data
         # Todo - Check to see that customer isn't in another inprogress  before agent accets
@@ -282,23 +375,38 @@ class HandleRequestNotificationSerializer(serializers.Serializer):
                 }
             )
 
-        # Accepts the request and create a transaction
-        request_instance = request_instance.update(request_status=reaction)
-        destination_coordinates = request_instance.request_meta[
-            "destination_coordinates"
-        ]
+        # Only the first agent to accept a broadcast request gets the exchange
+        if not DispatchService.claim_request(request_instance):
+            request_instance.update(request_status="WITHDRAWN")
+            raise serializers.ValidationError(
+                {"request_id": ["This request has already been accepted"]}
+            )
 
-        # Todo - Create Transaction and Start Process
-        ExchangeTransactions.objects.create(
-            transaction_status="IN-PROGRESS",
-            request=request_instance,
-            request_amount=request_instance.request_meta["request_amount"],
-            request_fees=request_instance.request_meta["fees"],
-            customer=request_instance.customer,
-            agent=agent_instance,
-            dest_latitude=destination_coordinates["lat"],
-            dest_longitude=destination_coordinates["lon"],
-        )
+        # Accepts the request and create a transaction
+        try:
+            with transaction.atomic():
+                request_instance = request_instance.update(request_status=reaction)
+                destination_coordinates = request_instance.request_meta[
+                    "destination_coordinates"
+                ]
+
+                # Todo - Create Transaction and Start Process
+                ExchangeTransactions.objects.create(
+                    transaction_status="IN-PROGRESS",
+                    request=request_instance,
+                    request_amount=request_instance.request_meta["request_amount"],
+                    request_fees=request_instance.request_meta["fees"],
+                    customer=request_instance.customer,
+                    agent=agent_instance,
+                    dest_latitude=destination_coordinates["lat"],
+                    dest_longitude=destination_coordinates["lon"],
+                )
+        except Exception:
+            DispatchService.release_claim(request_instance)
+            raise
+        RequestExpiryManager.cancel(request_instance.id)
+        DispatchService.withdraw_competing_requests(request_instance)
+        BusyUsersManager.mark_busy(request_instance.customer_id, agent_instance.id)
         current_coordinates = validated_data["current_coordinates"]
         computed_eta_data = UserDistanceManager.get_user_eta(
             current_coordinates["lat"],
@@ -323,7 +431,7 @@ class HandleRequestNotificationSerializer(serializers.Serializer):
         return validated_data
 
 
-class ExchangeTransactionSerializer(serializers.ModelSerializer):
+class ExchangeTransactionSerializer(BatchCacheMixin, serializers.ModelSerializer):
     customer = AgentsSerializer()
     agent = AgentsSerializer()
     transaction_stage = serializers.SerializerMethodField()
@@ -331,11 +439,28 @@ class ExchangeTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExchangeTransactions
         fields = "__all__"
+        list_serializer_class = BatchCacheListSerializer
         # depth = 1
 
+    @staticmethod
+    def with_participant_ratings(transactions_queryset):
+        """ Joins both participants and the stats behind their ratings """
+        return transactions_queryset.select_related(
+            "request", "customer__transaction_stats", "agent__transaction_stats"
+        )
+
+    def fetch_cached_values(self, instances) -> dict:
+        stage_field = TransactionSessionManager.stage_field(self.context["user"].id)
+        session_states = TransactionSessionManager.get_states(
+            [instance.request_id for instance in instances], stage_field
+        )
+        return {
+            instance.pk: session_state.get(stage_field)
+            for instance, session_state in zip(instances, session_states)
+        }
+
     def get_transaction_stage(self, obj):
-        user = self.context["user"]
-        return CacheManager.retrieve_key(f"{obj.request_id}:" f"{user.id}:stage")
+        return self.get_cached_value(obj)
 
 
 class CancelExchangeTransactionSerializer(serializers.Serializer):
@@ -377,6 +502,10 @@ class CancelExchangeTransactionSerializer(serializers.Serializer):
         ChannelManager.ws_publish(
             channel=f"transaction_{request_id}", payload=data_payload
         )
+        TransactionSessionManager.delete_session(request_id)
+        BusyUsersManager.release(
+            transaction_instance.customer_id, transaction_instance.agent_id
+        )
         return validated_data
 
 
@@ -420,4 +549,5 @@ class TransactionRatingSerializer(serializers.Serializer):
             rating_user=rating_user,
             rated_user=rated_user,
         )
+        TransactionStatsService.record_rating(rated_user.id, user_rating)
         return validated_data
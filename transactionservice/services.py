@@ -0,0 +1,537 @@
+import json
+from datetime import timedelta
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from sentry_sdk import capture_exception
+from userservice.models import User, UserDevices
+from utils.helpers import (
+    BusyUsersManager,
+    CacheManager,
+    ChannelManager,
+    MatchingManager,
+    RequestExpiryManager,
+)
+
+from transactionservice.models import (
+    ExchangeRequests,
+    ExchangeTransactions,
+    TransactionUserRatings,
+    UserTransactionStats,
+)
+
+
+class TransactionStatsService:
+    """ Keeps the materialized per-user transaction statistics up to date """
+
+    @classmethod
+    def get_user_stats(cls, user_instance) -> UserTransactionStats:
+        """ Returns the user's stats row, or empty stats if none was recorded """
+        try:
+            return user_instance.transaction_stats
+        except UserTransactionStats.DoesNotExist:
+            return UserTransactionStats(user=user_instance)
+
+    @classmethod
+    def get_acceptance_rates(cls, agent_ids: list) -> dict:
+        """
+        Smoothed share of recent requests each agent accepted
+
+        Agents with little history are pulled towards an even rate, so a
+        single response can't put them at either extreme. Requests left to
+        expire count as not accepted, withdrawn ones were never up to the
+        agent and are left out.
+        """
+        responded_since = timezone.now() - timedelta(
+            days=settings.AGENT_ACCEPTANCE_RATE_WINDOW_IN_DAYS
+        )
+        responses = (
+            ExchangeRequests.objects.filter(
+                agent_id__in=agent_ids,
+                request_status__in=["ACCEPTED", "DECLINED", "EXPIRED"],
+                created_at__gte=responded_since,
+            )
+            .order_by()
+            .values("agent")
+            .annotate(
+                accepted=Count("id", filter=Q(request_status="ACCEPTED")),
+                responded=Count("id"),
+            )
+        )
+        acceptance_rates = {agent_id: 0.5 for agent_id in agent_ids}
+        for response in responses:
+            acceptance_rates[response["agent"]] = (response["accepted"] + 1) / (
+                response["responded"] + 2
+            )
+        return acceptance_rates
+
+    @classmethod
+    def record_completed_transaction(cls, transaction_instance):
+        cls._increment(
+            transaction_instance.agent_id,
+            agent_txn_count=1,
+            agent_txn_volume=transaction_instance.request_amount
+            + transaction_instance.request_fees,
+        )
+        cls._increment(
+            transaction_instance.customer_id,
+            customer_txn_count=1,
+            customer_txn_volume=transaction_instance.request_amount,
+        )
+
+    @classmethod
+    def record_rating(cls, rated_user_id, user_rating: int):
+        cls._increment(rated_user_id, ratings_count=1, ratings_total=user_rating)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """ Recomputes every user's stats from transactions and ratings """
+        with transaction.atomic():
+            cls._lock_stats_table()
+            user_stats = {}
+
+            def stats_for(user_id):
+                return user_stats.setdefault(
+                    user_id, UserTransactionStats(user_id=user_id)
+                )
+
+            completed_transactions = ExchangeTransactions.objects.filter(
+                transaction_status="COMPLETED"
+            ).order_by()
+            for agent_stats in completed_transactions.values("agent").annotate(
+                txn_count=Count("id"),
+                txn_volume=Sum("request_amount") + Sum("request_fees"),
+            ):
+                stats = stats_for(agent_stats["agent"])
+                stats.agent_txn_count = agent_stats["txn_count"]
+                stats.agent_txn_volume = agent_stats["txn_volume"]
+
+            for customer_stats in completed_transactions.values("customer").annotate(
+                txn_count=Count("id"), txn_volume=Sum("request_amount")
+            ):
+                stats = stats_for(customer_stats["customer"])
+                stats.customer_txn_count = customer_stats["txn_count"]
+                stats.customer_txn_volume = customer_stats["txn_volume"]
+
+            for rating_stats in (
+                TransactionUserRatings.objects.order_by()
+                .values("rated_user")
+                .annotate(ratings_count=Count("id"), ratings_total=Sum("user_rating"))
+            ):
+                stats = stats_for(rating_stats["rated_user"])
+                stats.ratings_count = rating_stats["ratings_count"]
+                stats.ratings_total = rating_stats["ratings_total"]
+
+            UserTransactionStats.objects.all().delete()
+            UserTransactionStats.objects.bulk_create(
+                user_stats.values(), batch_size=1000
+            )
+        return len(user_stats)
+
+    @staticmethod
+    def _lock_stats_table():
+        """
+        Holds back increments until the rebuilt rows are swapped in
+
+        Without it an increment committed after the totals are read would be
+        dropped when the old rows are replaced.
+        """
+        if connection.vendor != "postgresql":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE "{UserTransactionStats._meta.db_table}" '
+                "IN SHARE ROW EXCLUSIVE MODE"
+            )
+
+    @staticmethod
+    def _increment(user_id, **increments):
+        UserTransactionStats.objects.get_or_create(user_id=user_id)
+        UserTransactionStats.objects.filter(user_id=user_id).update(
+            **{field: F(field) + value for field, value in increments.items()}
+        )
+
+
+class DispatchService:
+    """ Sends a searched exchange request to the chosen agents """
+
+    WINNER_TIMEOUT = 86400
+
+    @classmethod
+    def dispatch_request(cls, customer, agent, cached_request: dict):
+        created_request = ExchangeRequests.objects.create(
+            agent=agent,
+            customer=customer,
+            request_id=cached_request["request_search_id"],
+            request_meta=cached_request,
+        )
+        RequestExpiryManager.schedule(created_request.id)
+
+        # Send a Push Notification to the Agent
+        agent.send_push_notification(
+            **cls.build_invite(customer, cached_request, created_request.id)
+        )
+        return created_request
+
+    @classmethod
+    def broadcast_request(cls, customer, agents: list, cached_request: dict) -> list:
+        """ Creates the request for every agent at once, invites are sent later """
+        created_requests = ExchangeRequests.objects.bulk_create(
+            [
+                ExchangeRequests(
+                    agent=agent,
+                    customer=customer,
+                    request_id=cached_request["request_search_id"],
+                    request_meta=cached_request,
+                )
+                for agent in agents
+            ]
+        )
+        RequestExpiryManager.schedule(
+            *[created_request.id for created_request in created_requests]
+        )
+        return created_requests
+
+    @classmethod
+    def send_invites(cls, request_ids: list) -> int:
+        """ Notifies the agents of requests that are still pending """
+        pending_requests = ExchangeRequests.objects.filter(
+            id__in=request_ids, request_status="PENDING"
+        ).select_related("customer")
+        agent_devices = {
+            device.user_id: device
+            for device in UserDevices.objects.filter(
+                user_id__in=[request.agent_id for request in pending_requests],
+                active=True,
+            )
+        }
+        sent_invites = 0
+        for request in pending_requests:
+            device = agent_devices.get(request.agent_id)
+            if device is None:
+                continue
+            invite = cls.build_invite(
+                request.customer, request.request_meta, request.id
+            )
+            device.send_message(
+                title=invite["title"], body=invite["body"], data=invite["context"]
+            )
+            sent_invites += 1
+        return sent_invites
+
+    @staticmethod
+    def build_invite(customer, cached_request: dict, request_id: str) -> dict:
+        request_amount = "{:,.2f}".format(cached_request["request_amount"] / 100)
+        return dict(
+            title="New Cash Exchange Request",
+            body=(
+                f"{customer.first_name} is requesting a cash excahange of "
+                f"N{request_amount}"
+            ),
+            context={"request_id": request_id, "type": "NEW_REQUEST_INVITE"},
+        )
+
+    @classmethod
+    def build_winner_key(cls, request_search_id: str) -> str:
+        return f"request:{request_search_id}:winner"
+
+    @classmethod
+    def has_winner(cls, request_search_id: str) -> bool:
+        return (
+            CacheManager.retrieve_key(cls.build_winner_key(request_search_id))
+            is not None
+        )
+
+    @classmethod
+    def claim_request(cls, request_instance) -> bool:
+        """
+        Makes this request the accepted one for its search
+
+        Only the first agent to claim a search wins, so simultaneous accepts
+        cannot both go on to start a transaction.
+        """
+        return CacheManager.add_key(
+            cls.build_winner_key(request_instance.request_id),
+            request_instance.id,
+            timeout=cls.WINNER_TIMEOUT,
+        )
+
+    @classmethod
+    def release_claim(cls, request_instance):
+        CacheManager.delete_key(cls.build_winner_key(request_instance.request_id))
+
+    @classmethod
+    def withdraw_competing_requests(cls, request_instance) -> list:
+        """ Withdraws the search's other pending requests and tells their agents """
+        # Rows are locked so requests answered or expired meanwhile are left
+        # out, and only the agents whose request was withdrawn get told
+        with transaction.atomic():
+            withdrawn_ids = list(
+                ExchangeRequests.objects.filter(
+                    request_id=request_instance.request_id, request_status="PENDING"
+                )
+                .exclude(id=request_instance.id)
+                .select_for_update()
+                .values_list("id", flat=True)
+            )
+            # Withdrawn rather than declined, the agents never got to answer
+            ExchangeRequests.objects.filter(id__in=withdrawn_ids).update(
+                request_status="WITHDRAWN"
+            )
+        if not withdrawn_ids:
+            return withdrawn_ids
+        RequestExpiryManager.cancel(*withdrawn_ids)
+
+        event_payload = {
+            "event": "user.request.withdrawn",
+            "context": "AGENT",
+            "body": {},
+        }
+        for withdrawn_id in withdrawn_ids:
+            ChannelManager.ws_publish(
+                channel=f"transaction_{withdrawn_id}", payload=event_payload
+            )
+        return withdrawn_ids
+
+
+class RequestExpiryService:
+    """ Expires ignored requests and passes their search on to the next agent """
+
+    BATCH_SIZE = settings.REQUEST_EXPIRY_BATCH_SIZE
+
+    @classmethod
+    def expire_due_requests(cls) -> int:
+        expired_count = 0
+        while True:
+            due_request_ids = RequestExpiryManager.pop_due(cls.BATCH_SIZE)
+            if due_request_ids:
+                expired_count += cls.expire_requests(due_request_ids)
+            if len(due_request_ids) < cls.BATCH_SIZE:
+                return expired_count
+
+    @classmethod
+    def expire_requests(cls, request_ids: list) -> int:
+        # Requests answered since they were scheduled are left alone. Rows are
+        # locked so only the requests this sweep expired get announced below
+        with transaction.atomic():
+            expired_requests = list(
+                ExchangeRequests.objects.filter(
+                    id__in=request_ids, request_status="PENDING"
+                )
+                .select_related("customer")
+                .select_for_update(skip_locked=True, of=("self",))
+            )
+            ExchangeRequests.objects.filter(
+                id__in=[expired_request.id for expired_request in expired_requests]
+            ).update(request_status="EXPIRED")
+
+        # Requests skipped while locked elsewhere are checked again later
+        skipped_ids = list(
+            ExchangeRequests.objects.filter(
+                id__in=request_ids, request_status="PENDING"
+            ).values_list("id", flat=True)
+        )
+        if skipped_ids:
+            RequestExpiryManager.schedule(*skipped_ids)
+        if not expired_requests:
+            return 0
+
+        event_payload = {
+            "event": "user.request.expired",
+            "context": "AGENT",
+            "body": {},
+        }
+        for expired_request in expired_requests:
+            ChannelManager.ws_publish(
+                channel=f"transaction_{expired_request.id}", payload=event_payload
+            )
+
+        # Searches still waiting on a broadcast or already accepted stay put
+        expired_searches = {
+            expired_request.request_id: expired_request
+            for expired_request in expired_requests
+            if not DispatchService.has_winner(expired_request.request_id)
+        }
+        dispatched_agents = {}
+        open_search_ids = set()
+        for request_id, agent_id, request_status in ExchangeRequests.objects.filter(
+            request_id__in=expired_searches
+        ).values_list("request_id", "agent_id", "request_status"):
+            dispatched_agents.setdefault(request_id, set()).add(agent_id)
+            if request_status in ("PENDING", "ACCEPTED"):
+                open_search_ids.add(request_id)
+
+        next_agent_ids = {}
+        for request_id, expired_request in expired_searches.items():
+            if request_id in open_search_ids:
+                continue
+            # Search results are ordered best agent first
+            candidate_ids = [
+                agent_data["user_data"]["id"]
+                for agent_data in expired_request.request_meta["agents_info"]
+                if agent_data["user_data"]["id"] not in dispatched_agents[request_id]
+            ]
+            next_agent_ids[request_id] = BusyUsersManager.filter_available(
+                candidate_ids
+            )[:1]
+
+        agents = User.objects.in_bulk(
+            [
+                agent_id
+                for agent_ids in next_agent_ids.values()
+                for agent_id in agent_ids
+            ]
+        )
+        for request_id, agent_ids in next_agent_ids.items():
+            expired_request = expired_searches[request_id]
+            if agent_ids and agent_ids[0] in agents:
+                DispatchService.dispatch_request(
+                    expired_request.customer,
+                    agents[agent_ids[0]],
+                    expired_request.request_meta,
+                )
+                continue
+            expired_request.customer.send_push_notification(
+                title="Request Expired",
+                body="None of the agents found responded to your cash exchange request",
+                context={"request_id": request_id, "type": "REQUEST_EXPIRED"},
+            )
+        return len(expired_requests)
+
+
+class MatchingService:
+    """ Matches queued searches to agents in batches, minimising the total ETA """
+
+    @classmethod
+    def match_queued_requests(cls) -> int:
+        queued_searches = MatchingManager.pop_queued()
+        if not queued_searches:
+            return 0
+
+        # Searches that are matched, expired or already being answered
+        settled_search_ids = set()
+        matched_count = 0
+        try:
+            cached_requests = CacheManager.retrieve_keys(
+                [
+                    f"request:{request_search_id}"
+                    for request_search_id in queued_searches
+                ]
+            )
+            searches = {}
+            for request_search_id in queued_searches:
+                cached_request = cached_requests.get(f"request:{request_search_id}")
+                # Expired searches can no longer be dispatched
+                if cached_request is None:
+                    settled_search_ids.add(request_search_id)
+                    continue
+                searches[request_search_id] = json.loads(cached_request)
+
+            # Agents already sent a search are left out of its candidates, and
+            # searches with a request still open are left to that request
+            dispatched_pairs = set()
+            for request_id, agent_id, request_status in ExchangeRequests.objects.filter(
+                request_id__in=searches
+            ).values_list("request_id", "agent_id", "request_status"):
+                dispatched_pairs.add((request_id, agent_id))
+                if request_status in ("PENDING", "ACCEPTED"):
+                    settled_search_ids.add(request_id)
+            settled_search_ids.update(
+                request_search_id
+                for request_search_id in searches
+                if DispatchService.has_winner(request_search_id)
+            )
+
+            # Customers already in an exchange wait for a later batch
+            available_customer_ids = set(
+                BusyUsersManager.filter_available(
+                    list(
+                        {
+                            cached_request["customer_info"]["id"]
+                            for cached_request in searches.values()
+                        }
+                    )
+                )
+            )
+            searches = {
+                request_search_id: cached_request
+                for request_search_id, cached_request in searches.items()
+                if request_search_id not in settled_search_ids
+                and cached_request["customer_info"]["id"] in available_customer_ids
+            }
+
+            candidate_ids = {
+                agent_data["user_data"]["id"]
+                for cached_request in searches.values()
+                for agent_data in cached_request["agents_info"]
+            }
+            agent_ids = BusyUsersManager.filter_available(list(candidate_ids))
+            agent_columns = {
+                agent_id: column for column, agent_id in enumerate(agent_ids)
+            }
+
+            search_ids = list(searches)
+            cost_matrix = np.full(
+                (len(search_ids), len(agent_ids)), MatchingManager.UNMATCHABLE_COST
+            )
+            for row, request_search_id in enumerate(search_ids):
+                for agent_data in searches[request_search_id]["agents_info"]:
+                    agent_id = agent_data["user_data"]["id"]
+                    if agent_id not in agent_columns:
+                        continue
+                    if (request_search_id, agent_id) in dispatched_pairs:
+                        continue
+                    cost_matrix[row, agent_columns[agent_id]] = agent_data[
+                        "distance_details"
+                    ]["duration"]["value"]
+
+            assignment = MatchingManager.solve_assignment(cost_matrix)
+            users = User.objects.in_bulk(
+                [agent_ids[column] for _, column in assignment]
+                + [
+                    searches[search_ids[row]]["customer_info"]["id"]
+                    for row, _ in assignment
+                ]
+            )
+            for row, column in assignment:
+                request_search_id = search_ids[row]
+                cached_request = searches[request_search_id]
+                customer = users.get(cached_request["customer_info"]["id"])
+                agent = users.get(agent_ids[column])
+                if customer is None or agent is None:
+                    continue
+                try:
+                    created_request = DispatchService.dispatch_request(
+                        customer, agent, cached_request
+                    )
+                    settled_search_ids.add(request_search_id)
+                    matched_count += 1
+                    customer.send_push_notification(
+                        title="Agent Found",
+                        body=(
+                            f"{agent.first_name} has been sent your cash "
+                            "exchange request"
+                        ),
+                        context={
+                            "request_id": created_request.id,
+                            "type": "REQUEST_MATCHED",
+                        },
+                    )
+                except Exception as e:
+                    # One failed dispatch shouldn't cost the rest of the batch
+                    capture_exception(e)
+        finally:
+            # The queue was emptied up front, so anything left unsettled goes
+            # back on it, even when matching failed part way
+            MatchingManager.requeue(
+                {
+                    request_search_id: enqueued_at
+                    for request_search_id, enqueued_at in queued_searches.items()
+                    if request_search_id not in settled_search_ids
+                }
+            )
+        return matched_count
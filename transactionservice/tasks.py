@@ -0,0 +1,39 @@
+from celery import shared_task
+from utils.helpers import BusyUsersManager
+
+from transactionservice.models import ExchangeTransactions
+from transactionservice.services import (
+    DispatchService,
+    MatchingService,
+    RequestExpiryService,
+)
+
+
+@shared_task(name="reconcile_busy_users")
+def reconcile_busy_users():
+    """ Rebuilds the busy users set from in-progress exchanges """
+    busy_participants = ExchangeTransactions.objects.filter(
+        transaction_status="IN-PROGRESS"
+    ).values_list("customer_id", "agent_id")
+    busy_user_ids = set()
+    for customer_id, agent_id in busy_participants:
+        busy_user_ids.update([customer_id, agent_id])
+    BusyUsersManager.reconcile(list(busy_user_ids))
+    return len(busy_user_ids)
+
+
+@shared_task(name="match_queued_requests")
+def match_queued_requests():
+    """ Dispatches the searches queued for automatic matching """
+    return MatchingService.match_queued_requests()
+
+
+@shared_task(name="send_request_invites")
+def send_request_invites(request_ids=None):
+    return DispatchService.send_invites(request_ids)
+
+
+@shared_task(name="expire_pending_requests")
+def expire_pending_requests():
+    """ Expires pending requests that passed their deadline """
+    return RequestExpiryService.expire_due_requests()
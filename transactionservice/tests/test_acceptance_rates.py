@@ -0,0 +1,63 @@
+import pytest
+from django.utils.timezone import datetime
+from transactionservice.models import ExchangeRequests
+from userservice.models import User
+from utils.helpers import UserDistanceManager
+
+
+def create_user(index):
+    return User.objects.create(
+        email=f"acceptance_user_{index}@cashex.com",
+        mobile_number=f"0603696{index:04d}",
+        first_name=f"First{index}",
+        last_name=f"Last{index}",
+        dob=datetime(1990, 1, 1).date(),
+    )
+
+
+def create_requests(customer, agent, request_statuses):
+    for index, request_status in enumerate(request_statuses):
+        ExchangeRequests.objects.create(
+            agent=agent,
+            customer=customer,
+            request_id=f"search{agent.id}{index}",
+            request_status=request_status,
+        )
+
+
+@pytest.mark.django_db
+class TestAcceptanceRates:
+    def test_expired_requests_lower_the_agent_ranking(self):
+        """
+        Test that ignored requests count against an agent but withdrawn ones don't
+
+        GIVEN: Equally near agents that accepted, saw withdrawn and let expire
+        their requests
+
+        WHEN: the agents are ranked for a search
+
+        THEN: the accepting agent comes first and the one letting requests
+        expire comes last
+
+        """
+        customer = create_user(0)
+        accepting_agent, withdrawn_agent, ignoring_agent = [
+            create_user(index) for index in range(1, 4)
+        ]
+        create_requests(customer, accepting_agent, ["ACCEPTED", "ACCEPTED", "DECLINED"])
+        create_requests(customer, withdrawn_agent, ["WITHDRAWN"] * 3)
+        create_requests(customer, ignoring_agent, ["ACCEPTED"] + ["EXPIRED"] * 3)
+        route_summary = {"distance": 2.5, "duration": 600}
+
+        ranked_agents = UserDistanceManager.rank_agents(
+            [
+                (agent, route_summary)
+                for agent in (ignoring_agent, withdrawn_agent, accepting_agent)
+            ]
+        )
+
+        assert [agent for agent, _ in ranked_agents] == [
+            accepting_agent,
+            withdrawn_agent,
+            ignoring_agent,
+        ]
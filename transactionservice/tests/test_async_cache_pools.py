@@ -0,0 +1,104 @@
+import asyncio
+import weakref
+
+import aioredis
+import pytest
+from utils.helpers import AsyncCacheManager
+
+
+@pytest.fixture
+def created_pools(monkeypatch):
+    pools = []
+
+    async def create_redis_pool(*args, **kwargs):
+        pools.append(object())
+        return pools[-1]
+
+    monkeypatch.setattr(aioredis, "create_redis_pool", create_redis_pool)
+    monkeypatch.setattr(AsyncCacheManager, "_pool_tasks", weakref.WeakKeyDictionary())
+    return pools
+
+
+@pytest.fixture
+def event_loops():
+    loops = [asyncio.new_event_loop(), asyncio.new_event_loop()]
+    yield loops
+    for loop in loops:
+        loop.close()
+
+
+def get_client(loop):
+    return loop.run_until_complete(AsyncCacheManager.get_client())
+
+
+class TestAsyncCachePools:
+    def test_each_event_loop_keeps_its_own_pool(self, created_pools, event_loops):
+        """
+        Test that event loops don't replace each other's pool
+
+        GIVEN: Two event loops
+
+        WHEN: both loops ask for the client in turns
+
+        THEN: each loop gets one pool of its own and reuses it
+
+        """
+        first_loop, second_loop = event_loops
+
+        first_pool = get_client(first_loop)
+        second_pool = get_client(second_loop)
+
+        assert first_pool is not second_pool
+        assert get_client(first_loop) is first_pool
+        assert get_client(second_loop) is second_pool
+        assert len(created_pools) == 2
+
+    def test_pools_of_closed_loops_are_evicted(self, created_pools, event_loops):
+        """
+        Test that pools are dropped along with their event loop
+
+        GIVEN: Two event loops that have each used the client
+
+        WHEN: one loop is closed and the other asks for the client again
+
+        THEN: only the open loop keeps a pool
+
+        """
+        first_loop, second_loop = event_loops
+        get_client(first_loop)
+        get_client(second_loop)
+
+        first_loop.close()
+        get_client(second_loop)
+
+        assert list(AsyncCacheManager._pool_tasks) == [second_loop]
+
+    def test_failed_connects_are_retried(self, monkeypatch, event_loops):
+        """
+        Test that a failed connect isn't handed out again
+
+        GIVEN: Redis refusing the first connection
+
+        WHEN: the client is asked for twice on the same loop
+
+        THEN: the first call fails and the second one connects
+
+        """
+        connected_pool = object()
+        connect_results = [ConnectionRefusedError(), connected_pool]
+
+        async def create_redis_pool(*args, **kwargs):
+            result = connect_results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        monkeypatch.setattr(aioredis, "create_redis_pool", create_redis_pool)
+        monkeypatch.setattr(
+            AsyncCacheManager, "_pool_tasks", weakref.WeakKeyDictionary()
+        )
+        loop = event_loops[0]
+
+        with pytest.raises(ConnectionRefusedError):
+            get_client(loop)
+        assert get_client(loop) is connected_pool
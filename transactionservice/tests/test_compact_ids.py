@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+from django.utils.timezone import datetime
+from transactionservice.models import ExchangeRequests
+from userservice.models import User
+
+
+def create_user(index):
+    return User.objects.create(
+        email=f"ids_user_{index}@cashex.com",
+        mobile_number=f"0903696{index:04d}",
+        first_name=f"First{index}",
+        last_name=f"Last{index}",
+        dob=datetime(1990, 1, 1).date(),
+    )
+
+
+def create_request():
+    return ExchangeRequests.objects.create(
+        agent=create_user(0), customer=create_user(1), request_id="search0"
+    )
+
+
+@pytest.mark.django_db
+class TestCompactIds:
+    def test_ids_round_trip_as_hex(self):
+        """
+        Test that ids are read back in the form they were generated in
+
+        GIVEN: An exchange request between two users
+
+        WHEN: the request is fetched by its id, dashed id and uuid
+
+        THEN: every lookup finds it and all ids are 32 hex characters
+
+        """
+        exchange_request = create_request()
+        request_uuid = uuid.UUID(hex=exchange_request.id)
+
+        assert exchange_request.id == request_uuid.hex
+        for lookup_id in [exchange_request.id, str(request_uuid), request_uuid]:
+            fetched_request = ExchangeRequests.objects.get(id=lookup_id)
+            assert fetched_request.id == exchange_request.id
+            assert fetched_request.agent_id == exchange_request.agent.id
+            assert fetched_request.customer_id == exchange_request.customer.id
+        assert list(
+            ExchangeRequests.objects.filter(agent=exchange_request.agent).values_list(
+                "id", "agent_id"
+            )
+        ) == [(exchange_request.id, exchange_request.agent.id)]
+
+    def test_malformed_ids_match_nothing(self):
+        """
+        Test that lookups with malformed ids return no rows
+
+        GIVEN: An exchange request
+
+        WHEN: requests are looked up with ids that aren't uuids
+
+        THEN: nothing is found and no error is raised
+
+        """
+        exchange_request = create_request()
+
+        assert not ExchangeRequests.objects.filter(id="search0").exists()
+        assert not ExchangeRequests.objects.filter(agent="agent0").exists()
+        assert list(
+            ExchangeRequests.objects.filter(
+                id__in=["search0", exchange_request.id]
+            ).values_list("id", flat=True)
+        ) == [exchange_request.id]
+        with pytest.raises(ExchangeRequests.DoesNotExist):
+            ExchangeRequests.objects.get(id=exchange_request.id[:-1])
@@ -0,0 +1,135 @@
+import pytest
+from django.db import connection
+from django.db.models import Q
+from django.utils.timezone import datetime
+from paymentservice.models import TransactionPayments
+from transactionservice.models import ExchangeRequests, ExchangeTransactions
+from userservice.models import User
+from utils.model_helpers import generate_id
+
+SEEDED_USERS_COUNT = 50
+SEEDED_TRANSACTIONS_PER_USER = 20
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "postgresql",
+    reason="Query plans are only checked against Postgres",
+)
+
+
+def seed_exchanges():
+    users = [
+        User.objects.create(
+            email=f"index_user_{index}@cashex.com",
+            mobile_number=f"0803696{index:04d}",
+            first_name=f"First{index}",
+            last_name=f"Last{index}",
+            dob=datetime(1990, 1, 1).date(),
+        )
+        for index in range(SEEDED_USERS_COUNT)
+    ]
+    # Statuses are spread over every choice, as no single one dominates live
+    request_statuses = [status for status, _ in ExchangeRequests.REQUEST_STATUS]
+    transaction_statuses = [
+        status for status, _ in ExchangeTransactions.TRANSACTION_STATUS
+    ]
+    exchange_requests, exchange_transactions, transaction_payments = [], [], []
+    # Exchanges are interleaved across users, as they arrive over time
+    for count in range(SEEDED_TRANSACTIONS_PER_USER):
+        for index, agent in enumerate(users):
+            customer = users[index - 1]
+            exchange_request = ExchangeRequests(
+                agent=agent,
+                customer=customer,
+                request_id=f"search{index}x{count}",
+                request_status=request_statuses[count % len(request_statuses)],
+            )
+            exchange_transaction = ExchangeTransactions(
+                transaction_status=transaction_statuses[
+                    count % len(transaction_statuses)
+                ],
+                request=exchange_request,
+                request_amount=500000,
+                request_fees=10000,
+                customer=customer,
+                agent=agent,
+            )
+            exchange_requests.append(exchange_request)
+            exchange_transactions.append(exchange_transaction)
+            transaction_payments.append(
+                TransactionPayments(
+                    transaction=exchange_transaction,
+                    customer=customer,
+                    transaction_reference=f"ref{index}x{count}",
+                    transaction_amount=500000,
+                    payment_gateway="VFD_BANK",
+                )
+            )
+    ExchangeRequests.objects.bulk_create(exchange_requests)
+    ExchangeTransactions.objects.bulk_create(exchange_transactions)
+    TransactionPayments.objects.bulk_create(transaction_payments)
+
+    # Fresh tables have no statistics, so the planner can't judge the indexes
+    with connection.cursor() as cursor:
+        for model in [ExchangeRequests, ExchangeTransactions, TransactionPayments]:
+            cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+    return users
+
+
+def query_plan(queryset):
+    # Makes sequential scans a last resort, so any usable index gets picked
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    return queryset.explain()
+
+
+@pytest.mark.django_db
+class TestQueryIndexes:
+    def test_hot_queries_use_indexes(self):
+        """
+        Test that the hot request, transaction and payment lookups use indexes
+
+        GIVEN: Seeded exchange requests, transactions and payments
+
+        WHEN: the queries behind listings, reactions and payments are planned
+
+        THEN: each plan scans the index added for that query
+
+        """
+        user = seed_exchanges()[0]
+        hot_queries = {
+            "pending requests": (
+                ExchangeRequests.status.pending().filter(agent=user),
+                ["exreq_agent_status_created_idx"],
+            ),
+            "search requests": (
+                ExchangeRequests.objects.filter(
+                    request_id="search0x0", request_status="PENDING"
+                ),
+                ["exreq_search_status_idx"],
+            ),
+            "completed transactions": (
+                ExchangeTransactions.status.completed().filter(
+                    Q(agent=user) | Q(customer=user)
+                ),
+                ["extxn_agent_status_created_idx", "extxn_cust_status_created_idx"],
+            ),
+            "request transaction": (
+                ExchangeTransactions.objects.filter(
+                    request_id=generate_id(), transaction_status="IN-PROGRESS"
+                ),
+                ["extxn_request_status_idx"],
+            ),
+            "payment": (
+                TransactionPayments.objects.filter(
+                    transaction_reference="ref0x0",
+                    customer=user,
+                    payment_gateway="VFD_BANK",
+                ),
+                ["txpay_ref_customer_gateway_idx"],
+            ),
+        }
+
+        for query_name, (queryset, index_names) in hot_queries.items():
+            plan = query_plan(queryset)
+            for index_name in index_names:
+                assert index_name in plan, f"{query_name}: {plan}"
@@ -0,0 +1,76 @@
+import pytest
+from django.utils.timezone import datetime
+from transactionservice.models import (
+    ExchangeRequests,
+    ExchangeTransactions,
+    UserTransactionStats,
+)
+from userservice.models import User
+from utils.helpers import TokenManager
+
+# User lookup, page count and the page itself
+TRANSACTION_LISTING_QUERY_BUDGET = 3
+
+
+def create_user(index):
+    user = User.objects.create(
+        email=f"listing_user_{index}@cashex.com",
+        mobile_number=f"0703696{index:04d}",
+        first_name=f"First{index}",
+        last_name=f"Last{index}",
+        dob=datetime(1990, 1, 1).date(),
+    )
+    UserTransactionStats.objects.create(user=user, ratings_count=2, ratings_total=9)
+    return user
+
+
+def create_transactions(customer, count):
+    for index in range(count):
+        agent = create_user(index + 1)
+        exchange_request = ExchangeRequests.objects.create(
+            agent=agent, customer=customer, request_id=f"search{index}"
+        )
+        ExchangeTransactions.objects.create(
+            transaction_status="COMPLETED",
+            request=exchange_request,
+            request_amount=500000,
+            request_fees=10000,
+            customer=customer,
+            agent=agent,
+            dest_latitude=6.5244,
+            dest_longitude=3.3792,
+        )
+
+
+@pytest.mark.django_db
+class TestTransactionListing:
+    @pytest.mark.parametrize("transactions_count", [1, 7])
+    def test_transaction_listing_query_budget(
+        self, client, django_assert_max_num_queries, transactions_count
+    ):
+        """
+        Test that listing transactions runs a constant number of queries
+
+        GIVEN: A customer with completed transactions with rated agents
+
+        WHEN: the customer lists their transactions
+
+        THEN: both participants' ratings are returned without a query per row
+
+        """
+        customer = create_user(0)
+        create_transactions(customer, transactions_count)
+        token = TokenManager.sign_token({"uid": customer.id})
+
+        with django_assert_max_num_queries(TRANSACTION_LISTING_QUERY_BUDGET):
+            response = client.get(
+                "/api/v1/exchange-transaction/all",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+
+        assert response.status_code == 200
+        transactions = response.json()["data"]
+        assert len(transactions) == transactions_count
+        assert all(
+            transaction["agent"]["ratings"] == 4.5 for transaction in transactions
+        )
@@ -7,6 +7,8 @@ from utils.helpers import CustomPaginator, ResponseManager, CacheManager
 
 from transactionservice.models import ExchangeRequests, ExchangeTransactions
 from transactionservice.serializers import (
+    AutoMatchRequestSerializer,
+    BroadcastRequestSerializer,
     CancelExchangeTransactionSerializer,
     DispatchRequestSerializer,
     ExchangeRequestsSerializer,
@@ -69,6 +71,38 @@ class ExchangeRequestViewset(viewsets.ViewSet):
             )
         return ResponseManager.handle_response(data=serialized_data.data)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="(?P<request_search_id>[a-z,A-Z,0-9]+)/broadcast",
+    )
+    def broadcast_request_to_agents(self, request, *args, **kwargs):
+        """ Sends the request to several agents, the first to accept gets it """
+        serialized_data = BroadcastRequestSerializer(
+            data={**request.data, **kwargs}, context={"user": request.user}
+        )
+        if not serialized_data.is_valid():
+            return ResponseManager.handle_response(
+                error=serialized_data.errors, status=400
+            )
+        return ResponseManager.handle_response(data=serialized_data.data)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="(?P<request_search_id>[a-z,A-Z,0-9]+)/auto-match",
+    )
+    def auto_match_request(self, request, *args, **kwargs):
+        """ Queues the search to be matched to an agent automatically """
+        serialized_data = AutoMatchRequestSerializer(
+            data=kwargs, context={"user": request.user}
+        )
+        if not serialized_data.is_valid():
+            return ResponseManager.handle_response(
+                error=serialized_data.errors, status=400
+            )
+        return ResponseManager.handle_response(data=serialized_data.data)
+
     @action(
         detail=False,
         methods=["get"],
@@ -87,7 +121,7 @@ class ExchangeRequestViewset(viewsets.ViewSet):
         requests_instance = requests_instance[request_state]().filter(agent=user)
         # Q(agent=user) | Q(customer=user))
 
-        paginator = CustomPaginator(url_suffix=request.path)
+        paginator = CustomPaginator.for_request(request)
         requests_instance = paginator.paginate_queryset(requests_instance, request)
         serialized_data = ExchangeRequestsSerializer(requests_instance, many=True)
 
@@ -120,8 +154,10 @@ class ExchangeTransactionsViewset(viewsets.ViewSet):
     def retrieve_single_transactions(self, request, *args, **kwargs):
         user = request.user
         request_id = kwargs["request_id"]
-        transaction_instance = ExchangeTransactions.objects.filter(
-            Q(agent=user) | Q(customer=user), request_id=request_id
+        transaction_instance = ExchangeTransactionSerializer.with_participant_ratings(
+            ExchangeTransactions.objects.filter(
+                Q(agent=user) | Q(customer=user), request_id=request_id
+            )
         ).first()
         if not transaction_instance:
             return ResponseManager.handle_response(
@@ -148,12 +184,12 @@ class ExchangeTransactionsViewset(viewsets.ViewSet):
             "COMPLETED": ExchangeTransactions.status.completed,
             "ALL": ExchangeTransactions.status.everything,
         }
-        transactions_instance = (
-            transactions_instance[transaction_state]()
-            .filter(Q(agent=user) | Q(customer=user))
-            .select_related("request", "customer", "agent")
+        transactions_instance = ExchangeTransactionSerializer.with_participant_ratings(
+            transactions_instance[transaction_state]().filter(
+                Q(agent=user) | Q(customer=user)
+            )
         )
-        paginator = CustomPaginator(url_suffix=request.path)
+        paginator = CustomPaginator.for_request(request)
         transactions_instance = paginator.paginate_queryset(
             transactions_instance, request
         )
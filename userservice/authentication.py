@@ -3,9 +3,12 @@ from django.conf import settings
 from django.utils.timezone import datetime
 from rest_framework import exceptions
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
-from utils.helpers import TokenManager, UsersAvailabilityManager, ResponseManager
-
-from userservice.models import User
+from utils.helpers import (
+    TokenManager,
+    UserCacheManager,
+    UsersAvailabilityManager,
+    ResponseManager,
+)
 
 
 class JSONWebTokenAuthentication(BaseAuthentication):
@@ -23,7 +26,7 @@ class JSONWebTokenAuthentication(BaseAuthentication):
                     }
                 )
             payload = TokenManager.decode_token(token)
-            user = User.objects.filter(id=payload["uid"]).first()
+            user = UserCacheManager.get_user(payload["uid"])
         except (jwt.DecodeError, IndexError, KeyError, ValueError):
             raise exceptions.AuthenticationFailed(
                 {
@@ -44,5 +47,5 @@ class JSONWebTokenAuthentication(BaseAuthentication):
                 }
             )
         # Update user's last seen
-        UsersAvailabilityManager.set_user_last_seen(user)
+        UsersAvailabilityManager.mark_user_seen(user)
         return (user, payload)
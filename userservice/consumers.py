@@ -1,5 +1,5 @@
 from channels.generic.websocket import WebsocketConsumer, AsyncJsonWebsocketConsumer
-from utils.helpers import CacheManager
+from utils.helpers import AsyncCacheManager
 
 
 class RegistrationConsumer(AsyncJsonWebsocketConsumer):
@@ -9,7 +9,9 @@ class RegistrationConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_add(self.reg_session, self.channel_name)
         await self.accept()
 
-        cached_reg_info = CacheManager.retrieve_key(f"reg_token:{self.reg_code}")
+        cached_reg_info = await AsyncCacheManager.retrieve_key(
+            f"reg_token:{self.reg_code}"
+        )
         if not cached_reg_info:
             await self.send_json({"message": "Unknown registration session "})
             return await self.close(1000)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from utils.helpers import TokenRevocationManager
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves unexpired tokens from the legacy blacklisted_tokens list "
+        "to the revocation store"
+    )
+
+    def handle(self, *args, **options):
+        migrated_count = TokenRevocationManager.migrate_legacy_blacklist()
+        self.stdout.write(
+            self.style.SUCCESS(f"Migrated {migrated_count} revoked token(s)")
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.5 on 2026-10-16 23:41
+
+from django.db import migrations
+import utils.model_helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userservice', '0009_auto_20210403_1806'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            utils.model_helpers.drop_referencing_like_indexes('userservice.User', 'userservice.UserDevices'),
+            utils.model_helpers.restore_hex_ids('userservice.User', 'userservice.UserDevices'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userdevices',
+            name='id',
+            field=utils.model_helpers.CompactUUIDField(default=utils.model_helpers.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
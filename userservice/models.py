@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractBaseUser
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
+from django.db import models, transaction
 from utils.constants import DEFAULT_AVATAR_URL
+from utils.helpers import UserCacheManager
 from utils.model_helpers import BaseAbstractModel
 from fcm_django.models import AbstractFCMDevice
 
@@ -77,6 +78,17 @@ class User(BaseAbstractModel, AbstractBaseUser):
         if device := self.get_device():  # Walrus Operator Yaaayyy
             device.send_message(title=title, body=body, data=context)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Drop cached copies once the change is visible to other processes
+        transaction.on_commit(lambda: UserCacheManager.invalidate(self.id))
+
+    def delete(self, *args, **kwargs):
+        user_id = self.id
+        deleted = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: UserCacheManager.invalidate(user_id))
+        return deleted
+
     def __str__(self):
         return f"User >>> {self.email}"
 
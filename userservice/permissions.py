@@ -1,5 +1,5 @@
 from rest_framework import exceptions, permissions
-from utils.helpers import CacheManager
+from utils.helpers import TokenRevocationManager
 
 
 class IsTokenBlackListed(permissions.BasePermission):
@@ -7,20 +7,13 @@ class IsTokenBlackListed(permissions.BasePermission):
         if request.headers.get("authorization"):
             try:
                 token = "".join(request.headers.get("authorization").split())[6:]
-                user_id = request.user.id
-                black_listed_tokens = CacheManager.retrieve_key("blacklisted_tokens")
-                if black_listed_tokens is not None:
-                    invalid_tokens = [
-                        invalid_token["token"]
-                        for invalid_token in black_listed_tokens
-                        if invalid_token["user_id"] == user_id
-                    ]
-                    if token in invalid_tokens:
-                        raise exceptions.PermissionDenied(
-                            {"error": "Session has expired. Please login again."}
-                        )
-                    else:
-                        return True
+                token_id = TokenRevocationManager.get_token_id(
+                    token, request.auth or {}
+                )
+                if TokenRevocationManager.is_revoked(token_id):
+                    raise exceptions.PermissionDenied(
+                        {"error": "Session has expired. Please login again."}
+                    )
                 return True
             except (KeyError, IndexError, ValueError):
                 raise exceptions.PermissionDenied(
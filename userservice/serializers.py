@@ -7,11 +7,9 @@ import phonenumbers
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.core.validators import validate_email
-from django.db.models import Avg, Count, Sum
-from django.db.models.functions import Coalesce
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-from transactionservice.models import ExchangeTransactions, TransactionUserRatings
+from transactionservice.services import TransactionStatsService
 from utils.helpers import CacheManager, VDFAuth
 
 from userservice.models import User, UserDevices
@@ -328,30 +326,17 @@ class UserProfileSerializer(DynamicFieldsModelSerializer):
         model = User
         exclude = ("account_meta",)
 
+    @staticmethod
+    def with_transaction_summary(users_queryset):
+        """ Joins the stats row behind `transaction_summary` into the query """
+        return users_queryset.select_related("transaction_stats")
+
     def get_transaction_summary(self, user_instance):
-        as_agent_qs = ExchangeTransactions.objects.filter(
-            agent=user_instance, transaction_status="COMPLETED"
-        )
-        agent_stats = as_agent_qs.aggregate(
-            total_volume=Coalesce(Sum("request_amount"), 0)
-            + Coalesce(Sum("request_fees"), 0),
-            txn_count=Count("agent"),
-        )
-        as_customer_qs = ExchangeTransactions.objects.filter(
-            customer=user_instance, transaction_status="COMPLETED"
-        )
-        customer_stats = as_customer_qs.aggregate(
-            total_volume=Coalesce(Sum("request_amount"), 0), txn_count=Count("customer")
-        )
-        user_ratings = TransactionUserRatings.objects.filter(
-            rated_user=user_instance
-        ).aggregate(average=Coalesce(Avg("user_rating"), 0))
-        total_txn = agent_stats["txn_count"] + customer_stats["txn_count"]
-        total_vol = agent_stats["total_volume"] + customer_stats["total_volume"]
+        user_stats = TransactionStatsService.get_user_stats(user_instance)
         return dict(
-            total_transactions=total_txn,
-            total_volume=total_vol,
-            avg_ratings=user_ratings["average"],
+            total_transactions=user_stats.total_transactions,
+            total_volume=user_stats.total_volume,
+            avg_ratings=user_stats.avg_ratings,
         )
 
     def validate_image_url_update(self, image_url):
@@ -14,6 +14,7 @@ from utils.helpers import (
     ChannelManager,
     ResponseManager,
     TokenManager,
+    TokenRevocationManager,
     VDFAuth,
 )
 
@@ -272,28 +273,13 @@ class AuthenticationService:
     def logout_user(request):
         user = request.user
         token = request.headers.get("authorization").split(" ")[1]
-        black_listed_tokens = CacheManager.retrieve_key("blacklisted_tokens")
-        backlist_data = {
+        payload = request.auth
+        token_id = TokenRevocationManager.get_token_id(token, payload)
+        if not TokenRevocationManager.revoke(token_id, payload["exp"]):
+            raise ValidationError({"error": "You are already logged out"})
+
+        return {
             "user_id": user.id,
             "token": token,
             "logout_at": timezone.now(),
         }
-        if black_listed_tokens is None:
-            black_listed_tokens = []
-            black_listed_tokens.append(backlist_data)
-            CacheManager.set_key("blacklisted_tokens", black_listed_tokens)
-            return backlist_data
-
-        invalid_tokens = [
-            invalid_token["token"]
-            for invalid_token in black_listed_tokens
-            if invalid_token["user_id"] == user.id
-        ]
-
-        if token in invalid_tokens:
-            raise ValidationError({"error": "You are already logged out"})
-
-        black_listed_tokens.append(backlist_data)
-        CacheManager.set_key("blacklisted_tokens", black_listed_tokens)
-
-        return backlist_data
@@ -1,5 +1,5 @@
 from celery import shared_task
-from utils.helpers import SendEmail
+from utils.helpers import SendEmail, UsersAvailabilityManager
 from django.conf import settings
 
 
@@ -47,3 +47,8 @@ def send_sms_notification(phone_no=None, message=None):
     response = requests.request("POST", url, data=payload)
     if response.ok:
         return response.text
+
+
+@shared_task(name="evict_stale_online_users")
+def evict_stale_online_users():
+    return UsersAvailabilityManager.evict_stale_users()
@@ -1,17 +1,34 @@
+import asyncio
 import hashlib
+import json
+import math
 import base64
-from datetime import timedelta
+import copy
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from string import Template
 from typing import List, Union, Dict
 
+import aioredis
+import httpx
 import jwt
+import numpy as np
 import requests
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.mail import EmailMessage
+from django.db import connections
+from django.db.models import Q, QuerySet
 from django.template.loader import render_to_string
+from django_redis import get_redis_connection
+from django.utils.dateparse import parse_datetime
 from django.utils.timezone import datetime
 from rest_framework.pagination import PageNumberPagination
 
@@ -46,6 +63,19 @@ class CacheManager:
     def retrieve_key(cls, key):
         return cache.get(key)
 
+    @classmethod
+    def retrieve_keys(cls, keys):
+        return cache.get_many(keys)
+
+    @classmethod
+    def add_key(cls, key, data, timeout=None) -> bool:
+        """ Sets the key only if it is not already set, returning whether it was """
+        return cache.add(key, data, timeout=timeout)
+
+    @classmethod
+    def set_keys(cls, data, timeout=None):
+        cache.set_many(data, timeout=timeout)
+
     @classmethod
     def retrieve_pattern(cls, pattern):
         return cache.keys(pattern)
@@ -63,32 +93,641 @@ class CacheManager:
         return [cls.delete_key(key) for key in keys]
 
 
+class AsyncCacheManager:
+    """
+    Awaitable counterpart of CacheManager for use inside async consumers
+
+    Keys and values are encoded exactly like the django-redis cache backend,
+    so both managers read and write the same entries.
+    """
+
+    # Pools only work on the loop that created them, so each loop gets its own.
+    # Their tasks hold the loop, so closed loops are evicted explicitly
+    _pool_tasks = weakref.WeakKeyDictionary()
+
+    @classmethod
+    async def get_client(cls):
+        current_loop = asyncio.get_event_loop()
+        cls._evict_closed_loops()
+        pool_task = cls._pool_tasks.get(current_loop)
+        if pool_task is None:
+            pool_task = current_loop.create_task(
+                aioredis.create_redis_pool(
+                    settings.REDIS_CONNECTION_URL,
+                    maxsize=settings.ASYNC_CACHE_MAX_CONNECTIONS,
+                )
+            )
+            cls._pool_tasks[current_loop] = pool_task
+        try:
+            return await pool_task
+        except Exception:
+            # The next call connects again rather than reusing the failure
+            if cls._pool_tasks.get(current_loop) is pool_task:
+                del cls._pool_tasks[current_loop]
+            raise
+
+    @classmethod
+    def _evict_closed_loops(cls):
+        for loop in [loop for loop in list(cls._pool_tasks) if loop.is_closed()]:
+            # A closed loop can't run the pool's close(); dropping the pool
+            # lets its transports close their sockets when collected
+            cls._pool_tasks.pop(loop, None)
+
+    @classmethod
+    async def set_key(cls, key, data, timeout=None):
+        redis_client = await cls.get_client()
+        await redis_client.set(
+            cache.client.make_key(key),
+            cache.client.encode(data),
+            expire=int(timeout or 0),
+        )
+
+    @classmethod
+    async def retrieve_key(cls, key):
+        redis_client = await cls.get_client()
+        value = await redis_client.get(cache.client.make_key(key))
+        return None if value is None else cache.client.decode(value)
+
+    @classmethod
+    async def retrieve_keys(cls, keys):
+        if not keys:
+            return {}
+        redis_client = await cls.get_client()
+        values = await redis_client.mget(*[cache.client.make_key(key) for key in keys])
+        return {
+            key: cache.client.decode(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    @classmethod
+    async def delete_key(cls, key: str = None):
+        redis_client = await cls.get_client()
+        return await redis_client.delete(cache.client.make_key(key))
+
+    @classmethod
+    async def delete_keys(cls, *keys):
+        redis_client = await cls.get_client()
+        return await redis_client.delete(*[cache.client.make_key(key) for key in keys])
+
+
 class UsersAvailabilityManager:
     """ Utility manager class for tracking user online status """
 
-    # Sets how long(in seconds) a user last seen data should be cached
-    LAST_SEEN_CACHE_TTL = 4000
     # Sets the time difference (in seconds) since a user was online 😁
     ELAPSE_LAST_SEEN_TTL = 5000
+    # Redis GEO set holding the last known position of online agents
+    PRESENCE_GEO_KEY = "presence:agents:geo"
+    # Redis sorted set of user ids scored by their last seen timestamp
+    PRESENCE_LAST_SEEN_KEY = "presence:last_seen"
+    # Latitude bounds accepted by Redis GEOADD
+    GEO_MAX_LATITUDE = 85.05112878
+    # Users seen within this many seconds are not written again
+    LAST_SEEN_WRITE_INTERVAL = settings.PRESENCE_WRITE_INTERVAL
+    # Pending last seen updates are flushed this often (in seconds) ...
+    LAST_SEEN_FLUSH_INTERVAL = settings.PRESENCE_FLUSH_INTERVAL
+    # ... or as soon as this many are waiting
+    LAST_SEEN_FLUSH_BATCH_SIZE = settings.PRESENCE_FLUSH_BATCH_SIZE
+
+    _last_marked_at = {}
+    _pending_last_seen = {}
+    _last_seen_lock = threading.Lock()
+    _flusher = None
+
+    @classmethod
+    def set_user_last_seen(cls, user, latitude=None, longitude=None):
+        """ Marks the user as online and refreshes an agent's position """
+        latitude = user.latitude if latitude is None else latitude
+        longitude = user.longitude if longitude is None else longitude
+
+        redis_client = get_redis_connection("default")
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.zadd(cls.PRESENCE_LAST_SEEN_KEY, {user.id: time.time()})
+        if user.account_type == "Agent" and cls._is_indexable(latitude, longitude):
+            pipeline.geoadd(cls.PRESENCE_GEO_KEY, longitude, latitude, user.id)
+        pipeline.execute()
+
+    @classmethod
+    def mark_user_seen(cls, user):
+        """
+        Throttled set_user_last_seen for hot request paths
+
+        Users already marked within LAST_SEEN_WRITE_INTERVAL are skipped and
+        the rest are queued for the next pipelined flush.
+        """
+        current_time = time.monotonic()
+        with cls._last_seen_lock:
+            last_marked_at = cls._last_marked_at.get(user.id)
+            if (
+                last_marked_at is not None
+                and current_time - last_marked_at < cls.LAST_SEEN_WRITE_INTERVAL
+            ):
+                return
+            cls._last_marked_at[user.id] = current_time
+            cls._pending_last_seen[user.id] = (
+                time.time(),
+                user.account_type == "Agent",
+                user.latitude,
+                user.longitude,
+            )
+            should_flush = len(cls._pending_last_seen) >= cls.LAST_SEEN_FLUSH_BATCH_SIZE
+
+        cls._start_flusher()
+        if should_flush:
+            cls.flush_last_seen()
 
     @classmethod
-    def set_user_last_seen(cls, user):
-        last_seen_data = {"user_id": user.id, "time": datetime.now()}
-        CacheManager.set_key(
-            key=f"last_seen:{user.id}",
-            data=last_seen_data,
-            timeout=cls.LAST_SEEN_CACHE_TTL,
+    def flush_last_seen(cls):
+        """ Writes every pending last seen update in a single pipeline """
+        with cls._last_seen_lock:
+            pending_last_seen, cls._pending_last_seen = cls._pending_last_seen, {}
+            expired_before = time.monotonic() - cls.LAST_SEEN_WRITE_INTERVAL
+            cls._last_marked_at = {
+                user_id: marked_at
+                for user_id, marked_at in cls._last_marked_at.items()
+                if marked_at > expired_before
+            }
+        if not pending_last_seen:
+            return
+
+        pipeline = get_redis_connection("default").pipeline(transaction=False)
+        pipeline.zadd(
+            cls.PRESENCE_LAST_SEEN_KEY,
+            {user_id: last_seen[0] for user_id, last_seen in pending_last_seen.items()},
         )
+        for user_id, (_, is_agent, latitude, longitude) in pending_last_seen.items():
+            if is_agent and cls._is_indexable(latitude, longitude):
+                pipeline.geoadd(cls.PRESENCE_GEO_KEY, longitude, latitude, user_id)
+        pipeline.execute()
+
+    @classmethod
+    def _start_flusher(cls):
+        with cls._last_seen_lock:
+            if cls._flusher and cls._flusher.is_alive():
+                return
+            cls._flusher = threading.Thread(
+                target=cls._run_flusher, name="presence-flusher", daemon=True
+            )
+            cls._flusher.start()
+
+    @classmethod
+    def _run_flusher(cls):
+        while True:
+            time.sleep(cls.LAST_SEEN_FLUSH_INTERVAL)
+            try:
+                cls.flush_last_seen()
+            except Exception as e:
+                capture_exception(e)
+
+    @classmethod
+    async def async_set_user_last_seen(cls, user, latitude=None, longitude=None):
+        """ Awaitable set_user_last_seen for use inside async consumers """
+        latitude = user.latitude if latitude is None else latitude
+        longitude = user.longitude if longitude is None else longitude
+
+        redis_client = await AsyncCacheManager.get_client()
+        pipeline = redis_client.pipeline()
+        pipeline.zadd(cls.PRESENCE_LAST_SEEN_KEY, time.time(), user.id)
+        if user.account_type == "Agent" and cls._is_indexable(latitude, longitude):
+            pipeline.geoadd(cls.PRESENCE_GEO_KEY, longitude, latitude, user.id)
+        await pipeline.execute()
 
     # Retrieve online users
     @classmethod
     def get_online_users_ids(cls):
-        user_cache_keys = CacheManager.retrieve_pattern("last_seen:*")
-        if user_cache_keys is None:
+        redis_client = get_redis_connection("default")
+        time_in_past = time.time() - cls.ELAPSE_LAST_SEEN_TTL
+        user_ids = redis_client.zrangebyscore(
+            cls.PRESENCE_LAST_SEEN_KEY, time_in_past, "+inf"
+        )
+        return [user_id.decode() for user_id in user_ids]
+
+    @classmethod
+    def get_online_users_ids_within(
+        cls, latitude: float, longitude: float, radius_in_km: float
+    ) -> List[str]:
+        """ Retrieves online agents around a location, nearest first """
+        redis_client = get_redis_connection("default")
+        nearby_user_ids = redis_client.georadius(
+            cls.PRESENCE_GEO_KEY,
+            longitude,
+            latitude,
+            radius_in_km,
+            unit="km",
+            sort="ASC",
+        )
+        if not nearby_user_ids:
             return []
-        users_data = [CacheManager.retrieve_key(key) for key in user_cache_keys]
-        time_in_past = datetime.now() - timedelta(seconds=cls.ELAPSE_LAST_SEEN_TTL)
-        return [user["user_id"] for user in users_data if user["time"] > time_in_past]
+
+        pipeline = redis_client.pipeline(transaction=False)
+        for user_id in nearby_user_ids:
+            pipeline.zscore(cls.PRESENCE_LAST_SEEN_KEY, user_id)
+        last_seen_scores = pipeline.execute()
+
+        time_in_past = time.time() - cls.ELAPSE_LAST_SEEN_TTL
+        return [
+            user_id.decode()
+            for user_id, last_seen in zip(nearby_user_ids, last_seen_scores)
+            if last_seen is not None and last_seen > time_in_past
+        ]
+
+    @classmethod
+    def evict_stale_users(cls) -> int:
+        """ Removes users not seen within `ELAPSE_LAST_SEEN_TTL` """
+        redis_client = get_redis_connection("default")
+        time_in_past = time.time() - cls.ELAPSE_LAST_SEEN_TTL
+        stale_user_ids = redis_client.zrangebyscore(
+            cls.PRESENCE_LAST_SEEN_KEY, "-inf", time_in_past
+        )
+        if not stale_user_ids:
+            return 0
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.zrem(cls.PRESENCE_LAST_SEEN_KEY, *stale_user_ids)
+        pipeline.zrem(cls.PRESENCE_GEO_KEY, *stale_user_ids)
+        pipeline.execute()
+        return len(stale_user_ids)
+
+    @classmethod
+    def _is_indexable(cls, latitude, longitude) -> bool:
+        # Websocket clients may send coordinates as strings
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return False
+        return abs(latitude) <= cls.GEO_MAX_LATITUDE and abs(longitude) <= 180
+
+
+class BusyUsersManager:
+    """ Redis set of users taking part in an in-progress exchange """
+
+    BUSY_USERS_KEY = "busy_users"
+
+    @classmethod
+    def mark_busy(cls, *user_ids):
+        get_redis_connection("default").sadd(cls.BUSY_USERS_KEY, *user_ids)
+
+    @classmethod
+    def release(cls, *user_ids):
+        get_redis_connection("default").srem(cls.BUSY_USERS_KEY, *user_ids)
+
+    @classmethod
+    def is_busy(cls, user_id) -> bool:
+        return get_redis_connection("default").sismember(cls.BUSY_USERS_KEY, user_id)
+
+    @classmethod
+    def filter_available(cls, user_ids: List[str]) -> List[str]:
+        """ Drops busy users from `user_ids` in a single round trip """
+        if not user_ids:
+            return []
+        pipeline = get_redis_connection("default").pipeline(transaction=False)
+        for user_id in user_ids:
+            pipeline.sismember(cls.BUSY_USERS_KEY, user_id)
+        return [
+            user_id
+            for user_id, is_busy in zip(user_ids, pipeline.execute())
+            if not is_busy
+        ]
+
+    @classmethod
+    def reconcile(cls, busy_user_ids: List[str]):
+        """ Atomically replaces the set with the ids found in the database """
+        staging_key = f"{cls.BUSY_USERS_KEY}:staging"
+        pipeline = get_redis_connection("default").pipeline(transaction=True)
+        pipeline.delete(staging_key)
+        if busy_user_ids:
+            pipeline.sadd(staging_key, *busy_user_ids)
+            pipeline.rename(staging_key, cls.BUSY_USERS_KEY)
+        else:
+            pipeline.delete(cls.BUSY_USERS_KEY)
+        pipeline.execute()
+
+
+class RequestExpiryManager:
+    """
+    Deadlines of pending exchange requests, kept in a Redis sorted set
+
+    Sweeps pop due requests in batches straight from the set, so expiring
+    requests never needs to scan the requests table.
+    """
+
+    REQUEST_EXPIRY_KEY = "request_expiry"
+    EXPIRY_TIMEOUT = settings.REQUEST_EXPIRY_TIMEOUT
+    # Removes and returns up to ARGV[2] requests due by ARGV[1]
+    POP_DUE_SCRIPT = """
+        local due = redis.call(
+            "ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2]
+        )
+        if #due > 0 then
+            redis.call("ZREM", KEYS[1], unpack(due))
+        end
+        return due
+    """
+
+    @classmethod
+    def schedule(cls, *request_ids):
+        expires_at = time.time() + cls.EXPIRY_TIMEOUT
+        get_redis_connection("default").zadd(
+            cls.REQUEST_EXPIRY_KEY,
+            {request_id: expires_at for request_id in request_ids},
+        )
+
+    @classmethod
+    def cancel(cls, *request_ids):
+        if request_ids:
+            get_redis_connection("default").zrem(cls.REQUEST_EXPIRY_KEY, *request_ids)
+
+    @classmethod
+    def pop_due(cls, limit: int) -> List[str]:
+        due_request_ids = get_redis_connection("default").eval(
+            cls.POP_DUE_SCRIPT, 1, cls.REQUEST_EXPIRY_KEY, time.time(), limit
+        )
+        return [request_id.decode() for request_id in due_request_ids]
+
+
+class TransactionSessionManager:
+    """
+    Keeps the live state of an exchange in a single Redis hash per transaction
+
+    Fields are JSON encoded so flags, stages and coordinates round-trip
+    unchanged. Every write refreshes the session expiry and the session is
+    deleted once the transaction is completed, cancelled or reversed.
+    """
+
+    SESSION_TTL = settings.TRANSACTION_SESSION_TTL
+    # Applies the update only when `field` still holds the expected value
+    COMPARE_AND_SET_SCRIPT = """
+        local current = redis.call("HGET", KEYS[1], ARGV[1]) or ""
+        if current ~= ARGV[2] then
+            return {0, redis.call("HGETALL", KEYS[1])}
+        end
+        for index = 4, #ARGV, 2 do
+            redis.call("HSET", KEYS[1], ARGV[index], ARGV[index + 1])
+        end
+        redis.call("EXPIRE", KEYS[1], ARGV[3])
+        return {1, redis.call("HGETALL", KEYS[1])}
+    """
+
+    @staticmethod
+    def build_key(request_id) -> str:
+        return f"transaction_session:{request_id}"
+
+    @staticmethod
+    def stage_field(user_id) -> str:
+        return f"stage:{user_id}"
+
+    @classmethod
+    def get_state(cls, request_id, *fields) -> dict:
+        redis_client = get_redis_connection("default")
+        session_key = cls.build_key(request_id)
+        if not fields:
+            return cls._decode_state(redis_client.hgetall(session_key))
+        values = redis_client.hmget(session_key, fields)
+        return cls._decode_state(dict(zip(fields, values)))
+
+    @classmethod
+    def get_states(cls, request_ids: list, *fields) -> List[dict]:
+        """ Reads `fields` of several sessions in one round trip """
+        if not request_ids:
+            return []
+        pipeline = get_redis_connection("default").pipeline(transaction=False)
+        for request_id in request_ids:
+            pipeline.hmget(cls.build_key(request_id), fields)
+        return [
+            cls._decode_state(dict(zip(fields, values)))
+            for values in pipeline.execute()
+        ]
+
+    @classmethod
+    def update_state(cls, request_id, state: dict) -> dict:
+        """ Writes `state` and returns the whole session in one round trip """
+        session_key = cls.build_key(request_id)
+        pipeline = get_redis_connection("default").pipeline(transaction=True)
+        pipeline.hset(session_key, mapping=cls._encode_state(state))
+        pipeline.expire(session_key, cls.SESSION_TTL)
+        pipeline.hgetall(session_key)
+        return cls._decode_state(pipeline.execute()[-1])
+
+    @classmethod
+    def compare_and_set(cls, request_id, field, expected, state: dict):
+        """
+        Atomically writes `state` if `field` holds `expected`
+
+        Returns whether the update was applied and the resulting session.
+        """
+        redis_client = get_redis_connection("default")
+        is_applied, session = redis_client.eval(
+            cls.COMPARE_AND_SET_SCRIPT,
+            1,
+            cls.build_key(request_id),
+            *cls._build_compare_and_set_args(field, expected, state),
+        )
+        return bool(is_applied), cls._decode_state(cls._pairs_to_dict(session))
+
+    @classmethod
+    def delete_session(cls, request_id):
+        return get_redis_connection("default").delete(cls.build_key(request_id))
+
+    @classmethod
+    def _build_compare_and_set_args(cls, field, expected, state: dict) -> list:
+        expected_value = "" if expected is None else json.dumps(expected)
+        args = [field, expected_value, cls.SESSION_TTL]
+        for state_field, value in cls._encode_state(state).items():
+            args.extend([state_field, value])
+        return args
+
+    @staticmethod
+    def _encode_state(state: dict) -> dict:
+        return {field: json.dumps(value) for field, value in state.items()}
+
+    @staticmethod
+    def _decode_state(session: dict) -> dict:
+        return {
+            field.decode() if isinstance(field, bytes) else field: json.loads(value)
+            for field, value in session.items()
+            if value is not None
+        }
+
+    @staticmethod
+    def _pairs_to_dict(pairs: list) -> dict:
+        return dict(zip(pairs[::2], pairs[1::2]))
+
+
+class AsyncTransactionSessionManager(TransactionSessionManager):
+    """ Awaitable TransactionSessionManager for use inside async consumers """
+
+    @classmethod
+    async def get_state(cls, request_id, *fields) -> dict:
+        redis_client = await AsyncCacheManager.get_client()
+        session_key = cls.build_key(request_id)
+        if not fields:
+            return cls._decode_state(await redis_client.hgetall(session_key))
+        values = await redis_client.hmget(session_key, *fields)
+        return cls._decode_state(dict(zip(fields, values)))
+
+    @classmethod
+    async def update_state(cls, request_id, state: dict) -> dict:
+        redis_client = await AsyncCacheManager.get_client()
+        session_key = cls.build_key(request_id)
+        transaction = redis_client.multi_exec()
+        transaction.hmset_dict(session_key, cls._encode_state(state))
+        transaction.expire(session_key, cls.SESSION_TTL)
+        transaction.hgetall(session_key)
+        return cls._decode_state((await transaction.execute())[-1])
+
+    @classmethod
+    async def compare_and_set(cls, request_id, field, expected, state: dict):
+        redis_client = await AsyncCacheManager.get_client()
+        is_applied, session = await redis_client.eval(
+            cls.COMPARE_AND_SET_SCRIPT,
+            keys=[cls.build_key(request_id)],
+            args=cls._build_compare_and_set_args(field, expected, state),
+        )
+        return bool(is_applied), cls._decode_state(cls._pairs_to_dict(session))
+
+    @classmethod
+    async def delete_session(cls, request_id):
+        redis_client = await AsyncCacheManager.get_client()
+        return await redis_client.delete(cls.build_key(request_id))
+
+
+class RedisSubscriber:
+    """
+    Dispatches messages published on a Redis channel from a daemon thread
+
+    The subscription is re-established after connection errors and
+    `is_healthy` reports whether messages are currently being received.
+    """
+
+    RECONNECT_DELAY = 1
+
+    def __init__(self, channel: str, handler, on_subscribe=None):
+        self.channel = channel
+        self.handler = handler
+        self.on_subscribe = on_subscribe
+        self.is_healthy = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Starts the listener once per process, including after a fork """
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.is_healthy = False
+            self._thread = threading.Thread(
+                target=self._listen, name=f"subscriber:{self.channel}", daemon=True
+            )
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub()
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        if self.on_subscribe:
+                            self.on_subscribe()
+                        self.is_healthy = True
+                    elif message["type"] == "message":
+                        self.handler(message["data"])
+            except Exception as e:
+                capture_exception(e)
+            finally:
+                self.is_healthy = False
+            time.sleep(self.RECONNECT_DELAY)
+
+
+class UserCacheManager:
+    """
+    Bounded per-process cache of users keyed by id
+
+    Saving a user publishes its id so every process drops its copy. While
+    the invalidation listener is down the cache is bypassed, since updates
+    published in the meantime would be missed.
+    """
+
+    CACHE_TTL = settings.USER_CACHE_TTL
+    MAX_ENTRIES = settings.USER_CACHE_MAX_ENTRIES
+    INVALIDATION_CHANNEL = "user_cache:invalidate"
+
+    _users = OrderedDict()
+    _lock = threading.Lock()
+    # Generation of each user's latest invalidation, oldest first, so a load
+    # racing an invalidation can tell its row is stale
+    _generation = 0
+    _invalidations = OrderedDict()
+    # Generation up to which invalidations were dropped to bound memory
+    _forgotten_generation = 0
+
+    @classmethod
+    def get_user(cls, user_id):
+        """ Returns a private copy of the user, loading it on a miss """
+        cls.SUBSCRIBER.start()
+        if not cls.SUBSCRIBER.is_healthy:
+            return cls._load_user(user_id)
+
+        with cls._lock:
+            cached_user = cls._users.get(user_id)
+            if cached_user and cached_user[0] > time.monotonic():
+                cls._users.move_to_end(user_id)
+                return copy.deepcopy(cached_user[1])
+            cls._users.pop(user_id, None)
+            loaded_generation = cls._generation
+
+        user = cls._load_user(user_id)
+        if user:
+            with cls._lock:
+                invalidated_generation = cls._invalidations.get(
+                    user_id, cls._forgotten_generation
+                )
+                # Saves committed during the load leave the row out of the cache
+                if invalidated_generation <= loaded_generation:
+                    cls._users[user_id] = (time.monotonic() + cls.CACHE_TTL, user)
+                    while len(cls._users) > cls.MAX_ENTRIES:
+                        cls._users.popitem(last=False)
+            return copy.deepcopy(user)
+        return user
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cls._evict(user_id)
+        try:
+            get_redis_connection("default").publish(cls.INVALIDATION_CHANNEL, user_id)
+        except Exception as e:
+            # The save has already committed; other processes fall back to the TTL
+            capture_exception(e)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._users.clear()
+            cls._generation += 1
+            cls._invalidations.clear()
+            cls._forgotten_generation = cls._generation
+
+    @classmethod
+    def _evict(cls, user_id):
+        if isinstance(user_id, bytes):
+            user_id = user_id.decode()
+        with cls._lock:
+            cls._users.pop(user_id, None)
+            cls._generation += 1
+            cls._invalidations[user_id] = cls._generation
+            cls._invalidations.move_to_end(user_id)
+            while len(cls._invalidations) > cls.MAX_ENTRIES:
+                _, cls._forgotten_generation = cls._invalidations.popitem(last=False)
+
+    @staticmethod
+    def _load_user(user_id):
+        return get_user_model().objects.filter(id=user_id).first()
+
+
+UserCacheManager.SUBSCRIBER = RedisSubscriber(
+    UserCacheManager.INVALIDATION_CHANNEL,
+    handler=UserCacheManager._evict,
+    on_subscribe=UserCacheManager.clear,
+)
 
 
 class TokenManager:
@@ -99,6 +738,7 @@ class TokenManager:
                 **payload,
                 "iat": settings.JWT_SETTINGS["ISS_AT"](),
                 "exp": exipire_at or settings.JWT_SETTINGS["EXP_AT"](),
+                "jti": uuid.uuid4().hex,
             },
             settings.SECRET_KEY,
         )
@@ -113,24 +753,745 @@ class TokenManager:
         return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
 
 
+class BloomFilter:
+    """ Fixed-size Bloom filter sized for `capacity` items at `error_rate` """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(item)
+        )
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode()).digest()
+        first_hash = int.from_bytes(digest[:8], "big")
+        second_hash = int.from_bytes(digest[8:16], "big")
+        return [
+            (first_hash + index * second_hash) % self.size
+            for index in range(self.hash_count)
+        ]
+
+
+class TokenRevocationManager:
+    """
+    Revocation store keyed by token id (the `jti` claim)
+
+    Each revoked token gets its own key expiring with the token, so revoking
+    and checking are single Redis calls. A sorted set of revoked ids scored
+    by expiry lets each process rebuild an optional Bloom filter that answers
+    the common "not revoked" case without touching Redis. The filter is
+    rebuilt periodically so ids of expired tokens don't accumulate in it.
+    """
+
+    REVOKED_TOKENS_KEY = "revoked_tokens"
+    REVOCATION_CHANNEL = "revoked_tokens:published"
+    LEGACY_BLACKLIST_KEY = "blacklisted_tokens"
+    BLOOM_FILTER_ENABLED = settings.TOKEN_REVOCATION_BLOOM_FILTER
+    BLOOM_FILTER_CAPACITY = settings.TOKEN_REVOCATION_BLOOM_CAPACITY
+    BLOOM_FILTER_ERROR_RATE = settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE
+    BLOOM_FILTER_REBUILD_INTERVAL = settings.TOKEN_REVOCATION_BLOOM_REBUILD_INTERVAL
+
+    _bloom_filter = None
+    _bloom_filter_built_at = 0
+    # Filter being filled, so revocations published meanwhile aren't lost
+    _rebuilding_bloom_filter = None
+
+    @staticmethod
+    def get_token_id(token: str, payload: dict) -> str:
+        """ Tokens signed before `jti` was added are identified by their hash """
+        return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def build_key(token_id: str) -> str:
+        return f"revoked_token:{token_id}"
+
+    @classmethod
+    def revoke(cls, token_id: str, expires_at: int) -> bool:
+        """ Revokes a token until it expires, returning False if already revoked """
+        current_time = time.time()
+        pipeline = get_redis_connection("default").pipeline()
+        pipeline.set(
+            cls.build_key(token_id),
+            1,
+            ex=max(int(expires_at - current_time), 1),
+            nx=True,
+        )
+        pipeline.zadd(cls.REVOKED_TOKENS_KEY, {token_id: expires_at})
+        pipeline.zremrangebyscore(cls.REVOKED_TOKENS_KEY, "-inf", current_time)
+        pipeline.publish(cls.REVOCATION_CHANNEL, token_id)
+        return bool(pipeline.execute()[0])
+
+    @classmethod
+    def is_revoked(cls, token_id: str) -> bool:
+        if cls.BLOOM_FILTER_ENABLED:
+            cls.SUBSCRIBER.start()
+            bloom_filter = cls._bloom_filter
+            if cls.SUBSCRIBER.is_healthy and bloom_filter is not None:
+                cls._refresh_stale_bloom_filter()
+                bloom_filter = cls._bloom_filter
+                if token_id not in bloom_filter:
+                    return False
+        return bool(get_redis_connection("default").exists(cls.build_key(token_id)))
+
+    @classmethod
+    def migrate_legacy_blacklist(cls) -> int:
+        """ Moves unexpired tokens from the old blacklisted_tokens list """
+        migrated_count = 0
+        for blacklisted_token in (
+            CacheManager.retrieve_key(cls.LEGACY_BLACKLIST_KEY) or []
+        ):
+            token = blacklisted_token["token"]
+            try:
+                payload = TokenManager.parse_token(token)
+            except jwt.DecodeError:
+                continue
+            if payload.get("exp", 0) <= time.time():
+                continue
+            cls.revoke(cls.get_token_id(token, payload), payload["exp"])
+            migrated_count += 1
+        CacheManager.delete_key(cls.LEGACY_BLACKLIST_KEY)
+        return migrated_count
+
+    @classmethod
+    def rebuild_bloom_filter(cls):
+        """ Rebuilds the filter from the revoked tokens that haven't expired """
+        bloom_filter = BloomFilter(
+            cls.BLOOM_FILTER_CAPACITY, cls.BLOOM_FILTER_ERROR_RATE
+        )
+        cls._rebuilding_bloom_filter = bloom_filter
+        try:
+            revoked_token_ids = get_redis_connection("default").zrangebyscore(
+                cls.REVOKED_TOKENS_KEY, time.time(), "+inf"
+            )
+            for token_id in revoked_token_ids:
+                bloom_filter.add(token_id.decode())
+            cls._bloom_filter = bloom_filter
+            cls._bloom_filter_built_at = time.monotonic()
+        finally:
+            cls._rebuilding_bloom_filter = None
+
+    @classmethod
+    def _refresh_stale_bloom_filter(cls):
+        current_time = time.monotonic()
+        if (
+            current_time - cls._bloom_filter_built_at
+            < cls.BLOOM_FILTER_REBUILD_INTERVAL
+        ):
+            return
+        # Claimed up front so concurrent requests don't all rebuild it
+        cls._bloom_filter_built_at = current_time
+        try:
+            cls.rebuild_bloom_filter()
+        except Exception as e:
+            # The current filter stays correct, it only keeps expired ids longer
+            capture_exception(e)
+
+    @classmethod
+    def _add_to_bloom_filter(cls, token_id):
+        for bloom_filter in [cls._bloom_filter, cls._rebuilding_bloom_filter]:
+            if bloom_filter is not None:
+                bloom_filter.add(token_id.decode())
+
+
+TokenRevocationManager.SUBSCRIBER = RedisSubscriber(
+    TokenRevocationManager.REVOCATION_CHANNEL,
+    handler=TokenRevocationManager._add_to_bloom_filter,
+    on_subscribe=TokenRevocationManager.rebuild_bloom_filter,
+)
+
+
+class GeoManager:
+    """ Utility manager class for geographic computations """
+
+    GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+    EARTH_RADIUS_IN_METERS = 6371008.8
+    # A point enters a geofence within the first radius (in meters) and only
+    # leaves it beyond the second, so GPS jitter at the edge can't flap
+    GEOFENCE_ENTER_RADIUS = settings.GEOFENCE_ENTER_RADIUS
+    GEOFENCE_EXIT_RADIUS = settings.GEOFENCE_EXIT_RADIUS
+
+    @classmethod
+    def haversine_distances(
+        cls, latitudes, longitudes, dest_lat: float, dest_long: float
+    ) -> np.ndarray:
+        """ Computes great-circle distances (in meters) from many points to one """
+        latitudes = np.radians(np.asarray(latitudes, dtype=float))
+        longitudes = np.radians(np.asarray(longitudes, dtype=float))
+        dest_lat, dest_long = np.radians(dest_lat), np.radians(dest_long)
+        haversine = (
+            np.sin((dest_lat - latitudes) / 2) ** 2
+            + np.cos(latitudes)
+            * np.cos(dest_lat)
+            * np.sin((dest_long - longitudes) / 2) ** 2
+        )
+        return 2 * cls.EARTH_RADIUS_IN_METERS * np.arcsin(np.sqrt(haversine))
+
+    @classmethod
+    def haversine_distance(
+        cls, latitude: float, longitude: float, dest_lat: float, dest_long: float
+    ) -> float:
+        return float(
+            cls.haversine_distances([latitude], [longitude], dest_lat, dest_long)[0]
+        )
+
+    @classmethod
+    def is_within_geofence(
+        cls,
+        latitude: float,
+        longitude: float,
+        fence_lat: float,
+        fence_long: float,
+        was_inside=False,
+    ) -> bool:
+        """ Decides geofence membership with hysteresis on the previous state """
+        fence_radius = (
+            cls.GEOFENCE_EXIT_RADIUS if was_inside else cls.GEOFENCE_ENTER_RADIUS
+        )
+        distance = cls.haversine_distance(
+            float(latitude), float(longitude), float(fence_lat), float(fence_long)
+        )
+        return distance <= fence_radius
+
+    @classmethod
+    def geohash_encode(cls, latitude: float, longitude: float, precision=7) -> str:
+        """ Encodes a coordinate into a geohash of `precision` characters """
+        latitude_range = [-90.0, 90.0]
+        longitude_range = [-180.0, 180.0]
+        geohash = []
+        char_bits = bit_count = 0
+        is_longitude_bit = True
+        while len(geohash) < precision:
+            value, value_range = (
+                (longitude, longitude_range)
+                if is_longitude_bit
+                else (latitude, latitude_range)
+            )
+            mid_point = (value_range[0] + value_range[1]) / 2
+            if value >= mid_point:
+                char_bits = (char_bits << 1) | 1
+                value_range[0] = mid_point
+            else:
+                char_bits = char_bits << 1
+                value_range[1] = mid_point
+            is_longitude_bit = not is_longitude_bit
+            bit_count += 1
+            if bit_count == 5:
+                geohash.append(cls.GEOHASH_BASE32[char_bits])
+                char_bits = bit_count = 0
+        return "".join(geohash)
+
+
+class RouteCacheManager:
+    """
+    Two tier cache for route summaries keyed on coordinates snapped to a geohash grid
+
+    An in-process LRU sits in front of the shared Redis cache so repeated
+    lookups from the same worker never leave the process.
+    """
+
+    GEOHASH_PRECISION = settings.ROUTE_CACHE_GEOHASH_PRECISION
+    CACHE_TTL = settings.ROUTE_CACHE_TTL
+    LOCAL_CACHE_TTL = settings.ROUTE_CACHE_LOCAL_TTL
+    LOCAL_MAX_ENTRIES = settings.ROUTE_CACHE_LOCAL_MAX_ENTRIES
+    # Routes shorter than this (in meters) are too sensitive to snapping to cache
+    MIN_CACHEABLE_DISTANCE = settings.ROUTE_CACHE_MIN_DISTANCE
+
+    _local_routes = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @classmethod
+    def build_key(cls, user_lat, user_long, dest_lat, dest_long) -> str:
+        origin = GeoManager.geohash_encode(
+            float(user_lat), float(user_long), cls.GEOHASH_PRECISION
+        )
+        destination = GeoManager.geohash_encode(
+            float(dest_lat), float(dest_long), cls.GEOHASH_PRECISION
+        )
+        return f"route:{origin}:{destination}"
+
+    @classmethod
+    def get_route(cls, route_key: str) -> Union[dict, None]:
+        return cls.get_routes([route_key]).get(route_key)
+
+    @classmethod
+    def get_routes(cls, route_keys: List[str]) -> Dict[str, dict]:
+        """ Fetches cached routes, consulting Redis only for local misses """
+        cached_routes = {}
+        local_misses = []
+        current_time = time.monotonic()
+        with cls._lock:
+            for route_key in route_keys:
+                cached_route = cls._local_routes.get(route_key)
+                if cached_route and cached_route[0] > current_time:
+                    cls._local_routes.move_to_end(route_key)
+                    cached_routes[route_key] = cached_route[1]
+                    continue
+                cls._local_routes.pop(route_key, None)
+                local_misses.append(route_key)
+
+        redis_routes = CacheManager.retrieve_keys(local_misses) if local_misses else {}
+        cls._store_local_routes(redis_routes)
+
+        with cls._lock:
+            cls._stats["local_hits"] += len(cached_routes)
+            cls._stats["redis_hits"] += len(redis_routes)
+            cls._stats["misses"] += len(local_misses) - len(redis_routes)
+        return {**cached_routes, **redis_routes}
+
+    @classmethod
+    def get_local_route(cls, route_key: str) -> Union[dict, None]:
+        """ Looks up the in-process tier only, never touching Redis """
+        with cls._lock:
+            cached_route = cls._local_routes.get(route_key)
+            if cached_route and cached_route[0] > time.monotonic():
+                cls._local_routes.move_to_end(route_key)
+                cls._stats["local_hits"] += 1
+                return cached_route[1]
+            cls._local_routes.pop(route_key, None)
+            cls._stats["misses"] += 1
+            return None
+
+    @classmethod
+    async def async_get_route(cls, route_key: str) -> Union[dict, None]:
+        route_summary = cls.get_local_route(route_key)
+        if route_summary is not None:
+            return route_summary
+        route_summary = await AsyncCacheManager.retrieve_key(route_key)
+        if route_summary is not None:
+            cls._store_local_routes({route_key: route_summary})
+            # Reclassify the local miss recorded above as a Redis hit
+            with cls._lock:
+                cls._stats["redis_hits"] += 1
+                cls._stats["misses"] -= 1
+        return route_summary
+
+    @classmethod
+    async def async_set_route(cls, route_key: str, route_summary: dict):
+        routes = cls._cacheable_routes({route_key: route_summary})
+        if not routes:
+            return
+        await AsyncCacheManager.set_key(route_key, route_summary, timeout=cls.CACHE_TTL)
+        cls._store_local_routes(routes)
+
+    @classmethod
+    def set_route(cls, route_key: str, route_summary: dict):
+        cls.set_routes({route_key: route_summary})
+
+    @classmethod
+    def set_routes(cls, routes: Dict[str, dict]):
+        routes = cls._cacheable_routes(routes)
+        if not routes:
+            return
+        CacheManager.set_keys(routes, timeout=cls.CACHE_TTL)
+        cls._store_local_routes(routes)
+
+    @classmethod
+    def _cacheable_routes(cls, routes: Dict[str, dict]) -> Dict[str, dict]:
+        return {
+            route_key: route_summary
+            for route_key, route_summary in routes.items()
+            if route_summary["distance"] >= cls.MIN_CACHEABLE_DISTANCE
+        }
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        with cls._lock:
+            return {**cls._stats, "local_entries": len(cls._local_routes)}
+
+    @classmethod
+    def _store_local_routes(cls, routes: Dict[str, dict]):
+        expires_at = time.monotonic() + cls.LOCAL_CACHE_TTL
+        with cls._lock:
+            for route_key, route_summary in routes.items():
+                cls._local_routes[route_key] = (expires_at, route_summary)
+                cls._local_routes.move_to_end(route_key)
+            while len(cls._local_routes) > cls.LOCAL_MAX_ENTRIES:
+                cls._local_routes.popitem(last=False)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service until `reset_timeout` seconds have passed
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call is short-circuited. Once the timeout elapses a single trial
+    call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at = None
+        self.is_trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.is_trial_running:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.is_trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failure_count = 0
+            self.opened_at = None
+            self.is_trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failure_count += 1
+            if self.is_trial_running or self.failure_count >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.is_trial_running = False
+
+
+class EtaEstimateManager:
+    """
+    Estimates road distance and duration from the straight-line distance
+
+    The detour factor and average speed start from the configured values
+    and are calibrated against every route the routing service resolves.
+    """
+
+    DETOUR_FACTOR = settings.ETA_FALLBACK_DETOUR_FACTOR
+    AVERAGE_SPEED = settings.ETA_FALLBACK_AVERAGE_SPEED  # Speed in meters/second
+    # Weight given to each new observation when calibrating
+    CALIBRATION_WEIGHT = 0.05
+    # Routes shorter than this (in meters) are too noisy to calibrate with
+    MIN_CALIBRATION_DISTANCE = 500
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def observe(cls, straight_line_distance, route_distance, route_duration):
+        if straight_line_distance < cls.MIN_CALIBRATION_DISTANCE or not route_duration:
+            return
+        detour_factor = min(max(route_distance / straight_line_distance, 1.0), 3.0)
+        average_speed = min(max(route_distance / route_duration, 1.0), 40.0)
+        with cls._lock:
+            cls.DETOUR_FACTOR += cls.CALIBRATION_WEIGHT * (
+                detour_factor - cls.DETOUR_FACTOR
+            )
+            cls.AVERAGE_SPEED += cls.CALIBRATION_WEIGHT * (
+                average_speed - cls.AVERAGE_SPEED
+            )
+
+    @classmethod
+    def estimate(cls, straight_line_distance) -> dict:
+        route_distance = straight_line_distance * cls.DETOUR_FACTOR
+        return dict(
+            distance=route_distance,
+            duration=route_distance / cls.AVERAGE_SPEED,
+            destination_street_name=None,
+            is_estimate=True,
+        )
+
+
+class AgentRankingManager:
+    """
+    Scores search candidates on min-max normalised features
+
+    Every feature is scaled to [0, 1] across the candidates, flipped where
+    lower is better, and combined with the configured weights.
+    """
+
+    WEIGHTS = settings.AGENT_RANKING_WEIGHTS
+    TOP_K = settings.AGENT_RANKING_TOP_K
+    LOWER_IS_BETTER = ("distance", "eta")
+
+    @classmethod
+    def score(cls, features: Dict[str, np.ndarray]) -> np.ndarray:
+        scores = None
+        for feature_name, weight in cls.WEIGHTS.items():
+            values = np.asarray(features[feature_name], dtype=float)
+            value_range = values.max() - values.min()
+            if value_range > 0:
+                normalised = (values - values.min()) / value_range
+            else:
+                # A feature every candidate shares can't separate them
+                normalised = np.zeros_like(values)
+            if feature_name in cls.LOWER_IS_BETTER and value_range > 0:
+                normalised = 1 - normalised
+            scores = (
+                weight * normalised if scores is None else scores + weight * normalised
+            )
+        return scores
+
+    @classmethod
+    def rank(cls, features: Dict[str, np.ndarray], top_k: int = None) -> np.ndarray:
+        """ Returns the indices of the `top_k` best candidates, best first """
+        scores = cls.score(features)
+        top_k = min(top_k or cls.TOP_K, len(scores))
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class MatchingManager:
+    """
+    Queue of searches opted into automatic matching and the assignment solver
+
+    Queued searches are matched in batches, assigning agents to requests so
+    that the total ETA across the whole batch is as small as possible.
+    """
+
+    MATCHING_QUEUE_KEY = "matching:queue"
+    MAX_WAIT = settings.MATCHING_MAX_WAIT
+    # Stands in for pairs that must never be assigned
+    UNMATCHABLE_COST = 1e12
+
+    @classmethod
+    def enqueue(cls, request_search_id: str):
+        get_redis_connection("default").zadd(
+            cls.MATCHING_QUEUE_KEY, {request_search_id: time.time()}, nx=True
+        )
+
+    @classmethod
+    def pop_queued(cls) -> Dict[str, float]:
+        """ Atomically takes every queued search with its enqueue time """
+        pipeline = get_redis_connection("default").pipeline(transaction=True)
+        pipeline.zrange(cls.MATCHING_QUEUE_KEY, 0, -1, withscores=True)
+        pipeline.delete(cls.MATCHING_QUEUE_KEY)
+        queued_searches, _ = pipeline.execute()
+        return {
+            request_search_id.decode(): enqueued_at
+            for request_search_id, enqueued_at in queued_searches
+        }
+
+    @classmethod
+    def requeue(cls, queued_searches: Dict[str, float]):
+        """ Puts unmatched searches back until they have waited MAX_WAIT """
+        waiting_since = time.time() - cls.MAX_WAIT
+        queued_searches = {
+            request_search_id: enqueued_at
+            for request_search_id, enqueued_at in queued_searches.items()
+            if enqueued_at > waiting_since
+        }
+        if queued_searches:
+            get_redis_connection("default").zadd(
+                cls.MATCHING_QUEUE_KEY, queued_searches, nx=True
+            )
+
+    @classmethod
+    def solve_assignment(cls, cost_matrix) -> List[tuple]:
+        """
+        Minimum cost bipartite matching (Hungarian algorithm)
+
+        Returns (row, column) pairs, leaving out pairs at UNMATCHABLE_COST.
+        """
+        cost_matrix = np.asarray(cost_matrix, dtype=float)
+        if not cost_matrix.size:
+            return []
+        is_transposed = cost_matrix.shape[0] > cost_matrix.shape[1]
+        costs = cost_matrix.T if is_transposed else cost_matrix
+        rows, columns = costs.shape
+
+        # Index 0 is a sentinel column for the row being inserted
+        row_potential = np.zeros(rows + 1)
+        column_potential = np.zeros(columns + 1)
+        column_match = np.zeros(columns + 1, dtype=int)
+        previous_column = np.zeros(columns + 1, dtype=int)
+        for row in range(1, rows + 1):
+            column_match[0] = row
+            current_column = 0
+            min_slack = np.full(columns + 1, np.inf)
+            is_used = np.zeros(columns + 1, dtype=bool)
+            while column_match[current_column] != 0:
+                is_used[current_column] = True
+                matched_row = column_match[current_column]
+                is_free = ~is_used[1:]
+                slack = (
+                    costs[matched_row - 1]
+                    - row_potential[matched_row]
+                    - column_potential[1:]
+                )
+                is_tighter = is_free & (slack < min_slack[1:])
+                min_slack[1:][is_tighter] = slack[is_tighter]
+                previous_column[1:][is_tighter] = current_column
+
+                free_slack = np.where(is_free, min_slack[1:], np.inf)
+                next_column = int(np.argmin(free_slack)) + 1
+                delta = free_slack[next_column - 1]
+                used_columns = np.flatnonzero(is_used)
+                row_potential[column_match[used_columns]] += delta
+                column_potential[used_columns] -= delta
+                min_slack[1:][is_free] -= delta
+                current_column = next_column
+
+            while current_column:
+                prior_column = previous_column[current_column]
+                column_match[current_column] = column_match[prior_column]
+                current_column = prior_column
+
+        assignment = []
+        for column in range(1, columns + 1):
+            if not column_match[column]:
+                continue
+            pair = (column_match[column] - 1, column - 1)
+            pair = pair[::-1] if is_transposed else pair
+            if cost_matrix[pair] < cls.UNMATCHABLE_COST:
+                assignment.append(pair)
+        return sorted(assignment)
+
+
 class ProjectOSRMProvider:
     BASE_URL = Template(
         # "http://localhost:5022/route/v1/driving/$user_long,$user_lat;$dest_long,$dest_lat")
         # "https://router.project-osrm.org/route/v1/driving/$user_long,$user_lat;$dest_long,$dest_lat")
         f"{settings.OSRM_BASE_URL}/route/v1/driving/$user_long,$user_lat;$dest_long,$dest_lat"
     )
+    TABLE_URL = Template(f"{settings.OSRM_BASE_URL}/table/v1/driving/$coordinates")
+    CIRCUIT_BREAKER = CircuitBreaker(
+        failure_threshold=settings.ROUTING_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.ROUTING_CIRCUIT_RESET_TIMEOUT,
+    )
 
     @classmethod
     def get_route_data(cls, **kwargs):
+        if not cls.CIRCUIT_BREAKER.allow_request():
+            return None
         try:
             print("Calling Matrix with>>>", kwargs)
             distance_response = requests.get(
                 cls.BASE_URL.substitute(**kwargs), timeout=2
             )
+            cls._record_response(distance_response)
             if not distance_response.ok or distance_response is None:
                 return None
             return distance_response.json()
         except Exception as e:
+            cls.CIRCUIT_BREAKER.record_failure()
+            capture_exception(e)
+            return None
+
+    @classmethod
+    def get_table_data(
+        cls, sources: List[tuple], dest_lat: float, dest_long: float, timeout=2
+    ) -> Union[dict, None]:
+        """
+        Fetches the distance and duration from many sources to one destination
+
+        Parameters:
+            sources (list): A list of (latitude, longitude) pairs
+            dest_lat (float): The destination latitude
+            dest_long (float): The destination longitude
+
+        Returns:
+            table_response (dict): OSRM table response, `durations[i][0]` and
+            `distances[i][0]` hold the values for `sources[i]`
+
+        """
+        if not cls.CIRCUIT_BREAKER.allow_request():
+            return None
+        try:
+            coordinates = ";".join(
+                f"{longitude},{latitude}"
+                for latitude, longitude in [*sources, (dest_lat, dest_long)]
+            )
+            table_response = requests.get(
+                cls.TABLE_URL.substitute(coordinates=coordinates),
+                params={
+                    "sources": ";".join(str(index) for index in range(len(sources))),
+                    "destinations": len(sources),
+                    "annotations": "duration,distance",
+                },
+                timeout=timeout,
+            )
+            cls._record_response(table_response)
+            if not table_response.ok:
+                return None
+            table_response = table_response.json()
+            if table_response.get("code") != "Ok":
+                return None
+            return table_response
+        except Exception as e:
+            cls.CIRCUIT_BREAKER.record_failure()
+            capture_exception(e)
+            return None
+
+    @classmethod
+    def _record_response(cls, response):
+        # Client errors (e.g. unroutable coordinates) say nothing about the service
+        if response.status_code >= 500:
+            cls.CIRCUIT_BREAKER.record_failure()
+        else:
+            cls.CIRCUIT_BREAKER.record_success()
+
+
+class AsyncProjectOSRMProvider:
+    """
+    Asynchronous counterpart of ProjectOSRMProvider for use inside consumers
+
+    Requests go through one pooled keep-alive client per event loop and share
+    the circuit breaker of the synchronous provider.
+    """
+
+    BASE_URL = ProjectOSRMProvider.BASE_URL
+    CIRCUIT_BREAKER = ProjectOSRMProvider.CIRCUIT_BREAKER
+
+    # Clients hold their loop through their connections, so closed loops
+    # have to be evicted explicitly rather than left to the weak references
+    _clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        current_loop = asyncio.get_event_loop()
+        cls._evict_closed_loops()
+        client = cls._clients.get(current_loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=2,
+                limits=httpx.Limits(
+                    max_connections=settings.ROUTING_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ROUTING_ASYNC_MAX_KEEPALIVE,
+                ),
+            )
+            cls._clients[current_loop] = client
+        return client
+
+    @classmethod
+    def _evict_closed_loops(cls):
+        for loop in [loop for loop in list(cls._clients) if loop.is_closed()]:
+            # A closed loop can't run aclose(); its selector is already gone,
+            # so dropping the client lets the sockets be collected
+            cls._clients.pop(loop, None)
+
+    @classmethod
+    async def get_route_data(cls, **kwargs):
+        if not cls.CIRCUIT_BREAKER.allow_request():
+            return None
+        try:
+            distance_response = await cls.get_client().get(
+                cls.BASE_URL.substitute(**kwargs)
+            )
+            ProjectOSRMProvider._record_response(distance_response)
+            if distance_response.is_error:
+                return None
+            return distance_response.json()
+        except Exception as e:
+            cls.CIRCUIT_BREAKER.record_failure()
             capture_exception(e)
             return None
 
@@ -138,26 +1499,27 @@ class ProjectOSRMProvider:
 class UserDistanceManager:
     SEARCH_RADIUS_IN_KM = 100000  # Distance in meters
     DISTANCE_MATRIX_PROVIDER = ProjectOSRMProvider
+    # Bounded pool used when the routing table service is unavailable
+    ROUTING_EXECUTOR = ThreadPoolExecutor(
+        max_workers=settings.ROUTING_MAX_WORKERS, thread_name_prefix="routing"
+    )
     # Compute user distance information
 
     @classmethod
     def get_user_eta_profile(cls, user, dest_lat: float, dest_long: float):
-        from userservice.serializers import UserProfileSerializer
-
-        distance_response = cls.DISTANCE_MATRIX_PROVIDER.get_route_data(
-            user_long=user.longitude,
-            user_lat=user.latitude,
-            dest_long=dest_long,
-            dest_lat=dest_lat,
-        )
-
-        if distance_response is None:
+        route_summary = cls.get_user_route_summary(user, dest_lat, dest_long)
+        if route_summary is None:
             return None
 
-        user_distance = distance_response["routes"][0]["distance"]
-        if user_distance > cls.SEARCH_RADIUS_IN_KM:
+        if route_summary["distance"] > cls.SEARCH_RADIUS_IN_KM:
             return None
 
+        return cls.build_user_eta_profile(user, route_summary)
+
+    @classmethod
+    def build_user_eta_profile(cls, user, route_summary: dict) -> dict:
+        from userservice.serializers import UserProfileSerializer
+
         user_data = UserProfileSerializer(
             user,
             fields=(
@@ -174,15 +1536,16 @@ class UserDistanceManager:
             ),
         ).data
         txns_summary = user_data.pop("transaction_summary")
-        dest_addr = distance_response["waypoints"][1]["name"]
-        user_duration = int(distance_response["routes"][0]["duration"])
+        user_distance = route_summary["distance"]
+        user_duration = int(route_summary["duration"])
         user_eta_data = {
             "user_data": {
                 **user_data,
                 "agent_rating": txns_summary["avg_ratings"],
                 "success_trans_count": txns_summary["total_transactions"],
             },
-            "destination_street_name": dest_addr or "Unnamed Street",
+            "destination_street_name": route_summary["destination_street_name"]
+            or "Unnamed Street",
             "distance_details": {
                 "distance": {
                     "text": cls.distance_converter(user_distance),
@@ -192,6 +1555,7 @@ class UserDistanceManager:
                     "text": cls.duration_converter(user_duration),
                     "value": user_duration,
                 },
+                "is_estimate": route_summary.get("is_estimate", False),
             },
             "requested_at": datetime.now(),
         }
@@ -202,14 +1566,257 @@ class UserDistanceManager:
         cls, dest_lat: float, dest_long: float, user_queryset: list
     ) -> Union[list, None]:
         """ Fetches all active users within the radius the set destination """
+        from userservice.serializers import UserProfileSerializer
+
+        if isinstance(user_queryset, QuerySet):
+            user_queryset = UserProfileSerializer.with_transaction_summary(
+                user_queryset
+            )
+        users = [
+            user
+            for user in user_queryset
+            if user.latitude is not None and user.longitude is not None
+        ]
+        if not users:
+            return []
+
+        # Road distance is never shorter than the great-circle distance
+        straight_line_distances = GeoManager.haversine_distances(
+            [user.latitude for user in users],
+            [user.longitude for user in users],
+            dest_lat,
+            dest_long,
+        )
+        within_radius = straight_line_distances <= cls.SEARCH_RADIUS_IN_KM
+        users = [user for user, is_near in zip(users, within_radius) if is_near]
+        if not users:
+            return []
+
+        users_route_summary = cls.get_users_route_summary(
+            users,
+            dest_lat,
+            dest_long,
+            straight_line_distances=straight_line_distances[within_radius],
+        )
         nearby_agents = []
-        for user in user_queryset:
-            user_data = UserDistanceManager.get_user_eta_profile(
-                user, dest_lat, dest_long
+        for user in users:
+            route_summary = users_route_summary.get(user.id)
+            if route_summary is None:
+                continue
+            if route_summary["distance"] > cls.SEARCH_RADIUS_IN_KM:
+                continue
+            nearby_agents.append((user, route_summary))
+        return [
+            cls.build_user_eta_profile(user, route_summary)
+            for user, route_summary in cls.rank_agents(nearby_agents)
+        ]
+
+    @classmethod
+    def rank_agents(cls, nearby_agents: list) -> list:
+        """ Keeps the best ranked (user, route summary) pairs, best first """
+        from transactionservice.services import TransactionStatsService
+
+        if not nearby_agents:
+            return []
+        users = [user for user, _ in nearby_agents]
+        users_stats = [TransactionStatsService.get_user_stats(user) for user in users]
+        acceptance_rates = TransactionStatsService.get_acceptance_rates(
+            [user.id for user in users]
+        )
+        ranked_indices = AgentRankingManager.rank(
+            {
+                "distance": [
+                    route_summary["distance"] for _, route_summary in nearby_agents
+                ],
+                "eta": [
+                    route_summary["duration"] for _, route_summary in nearby_agents
+                ],
+                "rating": [user_stats.avg_ratings for user_stats in users_stats],
+                "volume": [user_stats.total_volume for user_stats in users_stats],
+                "acceptance_rate": [acceptance_rates[user.id] for user in users],
+            }
+        )
+        return [nearby_agents[index] for index in ranked_indices]
+
+    @classmethod
+    def get_user_route_summary(cls, user, dest_lat: float, dest_long: float):
+        """ Resolves the route distance, duration and street name for one user """
+        return cls.get_route_summary(user.latitude, user.longitude, dest_lat, dest_long)
+
+    @classmethod
+    def get_route_summary(cls, user_lat, user_long, dest_lat, dest_long):
+        route_key = RouteCacheManager.build_key(
+            user_lat, user_long, dest_lat, dest_long
+        )
+        route_summary = RouteCacheManager.get_route(route_key)
+        if route_summary is not None:
+            return route_summary
+
+        route_summary = cls._fetch_route_summary(
+            user_lat, user_long, dest_lat, dest_long
+        )
+        if route_summary is None:
+            return EtaEstimateManager.estimate(
+                GeoManager.haversine_distance(user_lat, user_long, dest_lat, dest_long)
+            )
+        RouteCacheManager.set_route(route_key, route_summary)
+        return route_summary
+
+    @classmethod
+    def _request_route_summary(cls, user_lat, user_long, dest_lat, dest_long):
+        distance_response = cls.DISTANCE_MATRIX_PROVIDER.get_route_data(
+            user_long=user_long,
+            user_lat=user_lat,
+            dest_long=dest_long,
+            dest_lat=dest_lat,
+        )
+        if distance_response is None:
+            return None
+        return cls._summarize_route_response(distance_response)
+
+    @classmethod
+    def _summarize_route_response(cls, distance_response: dict) -> dict:
+        return dict(
+            distance=distance_response["routes"][0]["distance"],
+            duration=distance_response["routes"][0]["duration"],
+            destination_street_name=distance_response["waypoints"][1]["name"],
+        )
+
+    @classmethod
+    def _fetch_route_summary(cls, user_lat, user_long, dest_lat, dest_long):
+        route_summary = cls._request_route_summary(
+            user_lat, user_long, dest_lat, dest_long
+        )
+        if route_summary is None:
+            return None
+        EtaEstimateManager.observe(
+            GeoManager.haversine_distance(user_lat, user_long, dest_lat, dest_long),
+            route_summary["distance"],
+            route_summary["duration"],
+        )
+        return route_summary
+
+    @classmethod
+    def get_users_route_summary(
+        cls,
+        users: list,
+        dest_lat: float,
+        dest_long: float,
+        straight_line_distances=None,
+    ) -> Dict[str, dict]:
+        """
+        Resolves route summaries for many users within a single deadline
+
+        A single routing table call is attempted first. When it fails the
+        routes are fetched concurrently until the deadline, and users whose
+        route could not be resolved get a straight-line estimate instead.
+
+        """
+        deadline = time.monotonic() + settings.ROUTING_SEARCH_DEADLINE
+        if straight_line_distances is None:
+            straight_line_distances = GeoManager.haversine_distances(
+                [user.latitude for user in users],
+                [user.longitude for user in users],
+                dest_lat,
+                dest_long,
+            )
+        straight_line_distances = {
+            user.id: float(straight_line_distance)
+            for user, straight_line_distance in zip(users, straight_line_distances)
+        }
+        route_keys = {
+            user.id: RouteCacheManager.build_key(
+                user.latitude, user.longitude, dest_lat, dest_long
+            )
+            for user in users
+        }
+        cached_routes = RouteCacheManager.get_routes(list(route_keys.values()))
+        users_route_summary = {
+            user_id: cached_routes[route_key]
+            for user_id, route_key in route_keys.items()
+            if route_key in cached_routes
+        }
+        uncached_users = [user for user in users if user.id not in users_route_summary]
+        if not uncached_users:
+            return users_route_summary
+
+        fetched_route_summary = cls._fetch_users_route_summary(
+            uncached_users, dest_lat, dest_long, deadline
+        )
+        RouteCacheManager.set_routes(
+            {
+                route_keys[user_id]: route_summary
+                for user_id, route_summary in fetched_route_summary.items()
+            }
+        )
+        for user_id, route_summary in fetched_route_summary.items():
+            EtaEstimateManager.observe(
+                straight_line_distances[user_id],
+                route_summary["distance"],
+                route_summary["duration"],
+            )
+
+        estimated_route_summary = {
+            user.id: EtaEstimateManager.estimate(straight_line_distances[user.id])
+            for user in uncached_users
+            if user.id not in fetched_route_summary
+        }
+        return {
+            **users_route_summary,
+            **fetched_route_summary,
+            **estimated_route_summary,
+        }
+
+    @classmethod
+    def _fetch_users_route_summary(
+        cls, users: list, dest_lat: float, dest_long: float, deadline: float
+    ) -> Dict[str, dict]:
+        table_response = cls.DISTANCE_MATRIX_PROVIDER.get_table_data(
+            [(user.latitude, user.longitude) for user in users],
+            dest_lat,
+            dest_long,
+            timeout=settings.ROUTING_TABLE_TIMEOUT,
+        )
+        if table_response is not None:
+            return cls._parse_table_response(users, table_response)
+
+        route_futures = {
+            cls.ROUTING_EXECUTOR.submit(
+                cls._request_route_summary,
+                user.latitude,
+                user.longitude,
+                dest_lat,
+                dest_long,
+            ): user.id
+            for user in users
+        }
+        completed_futures, pending_futures = wait(
+            route_futures, timeout=max(deadline - time.monotonic(), 0)
+        )
+        for route_future in pending_futures:
+            route_future.cancel()
+
+        users_route_summary = {}
+        for route_future in completed_futures:
+            if route_future.exception() is None and route_future.result():
+                users_route_summary[route_futures[route_future]] = route_future.result()
+        return users_route_summary
+
+    @classmethod
+    def _parse_table_response(cls, users: list, table_response: dict) -> Dict:
+        destination_street_name = table_response["destinations"][0].get("name")
+        users_route_summary = {}
+        for index, user in enumerate(users):
+            distance = table_response["distances"][index][0]
+            duration = table_response["durations"][index][0]
+            if distance is None or duration is None:
+                continue
+            users_route_summary[user.id] = dict(
+                distance=distance,
+                duration=duration,
+                destination_street_name=destination_street_name,
             )
-            if user_data:
-                nearby_agents.append(user_data)
-        return nearby_agents
+        return users_route_summary
 
     @classmethod
     def get_user_eta(cls, user_lat, user_long, dest_lat, dest_long):
@@ -221,24 +1828,54 @@ class UserDistanceManager:
         #     duration_value=45,
         # )
 
-        eta_response = cls.DISTANCE_MATRIX_PROVIDER.get_route_data(
+        route_summary = cls.get_route_summary(user_lat, user_long, dest_lat, dest_long)
+        return cls.format_eta(route_summary)
+
+    @classmethod
+    async def async_get_user_eta(cls, user_lat, user_long, dest_lat, dest_long):
+        """ Awaitable get_user_eta that never blocks the event loop """
+        route_key = RouteCacheManager.build_key(
+            user_lat, user_long, dest_lat, dest_long
+        )
+        route_summary = await RouteCacheManager.async_get_route(route_key)
+        if route_summary is not None:
+            return cls.format_eta(route_summary)
+
+        distance_response = await AsyncProjectOSRMProvider.get_route_data(
             user_long=user_long,
             user_lat=user_lat,
             dest_long=dest_long,
             dest_lat=dest_lat,
         )
+        straight_line_distance = GeoManager.haversine_distance(
+            user_lat, user_long, dest_lat, dest_long
+        )
+        if distance_response is None:
+            return cls.format_eta(EtaEstimateManager.estimate(straight_line_distance))
+
+        route_summary = cls._summarize_route_response(distance_response)
+        EtaEstimateManager.observe(
+            straight_line_distance,
+            route_summary["distance"],
+            route_summary["duration"],
+        )
+        await RouteCacheManager.async_set_route(route_key, route_summary)
+        return cls.format_eta(route_summary)
 
-        if not eta_response:
+    @classmethod
+    def format_eta(cls, route_summary):
+        if not route_summary:
             return None
 
-        distance_value = int(eta_response["routes"][0]["distance"])
-        duration_value = int(eta_response["routes"][0]["duration"])
+        distance_value = int(route_summary["distance"])
+        duration_value = int(route_summary["duration"])
 
         return dict(
             distance_text=cls.distance_converter(distance_value),
             distance_value=distance_value,
             duration_text=cls.duration_converter(duration_value),
             duration_value=duration_value,
+            is_estimate=route_summary.get("is_estimate", False),
         )
 
     @classmethod
@@ -580,6 +2217,13 @@ class CustomPaginator(PageNumberPagination):
         else:
             self.url_suffix = ""
 
+    @classmethod
+    def for_request(cls, request):
+        """ Uses cursor pagination when the client asks for it """
+        if request.query_params.get("pagination") == "cursor":
+            return CustomCursorPaginator(url_suffix=request.path)
+        return cls(url_suffix=request.path)
+
     def paginate_queryset(self, queryset, request, view=None):
         from django.core.paginator import InvalidPage
 
@@ -652,6 +2296,123 @@ class CustomPaginator(PageNumberPagination):
         return query_str
 
 
+class CustomCursorPaginator(CustomPaginator):
+    """
+    Keyset pagination on (created_at, id), newest first
+
+    Pages are fetched by seeking past the cursor instead of counting and
+    offsetting, so deep pages cost the same as the first one.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.host = settings.BACKEND_URL
+        self.request = request
+        page_size = self.get_page_size(self.request)
+        if not page_size:
+            return None
+
+        self.approximate_count = None
+        if request.query_params.get(self.count_query_param) == "approximate":
+            self.approximate_count = self.get_approximate_count(queryset)
+
+        position, self.is_reversed = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        if position is not None:
+            created_at, instance_id = position
+            seek = "gt" if self.is_reversed else "lt"
+            queryset = queryset.filter(
+                Q(**{f"created_at__{seek}": created_at})
+                | Q(created_at=created_at, **{f"id__{seek}": instance_id})
+            )
+        ordering = ("created_at", "id") if self.is_reversed else ("-created_at", "-id")
+        page = list(queryset.order_by(*ordering)[: page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if self.is_reversed:
+            page.reverse()
+
+        self.page = page
+        self.has_next = (not self.is_reversed and has_more) or (
+            self.is_reversed and position is not None
+        )
+        self.has_previous = (self.is_reversed and has_more) or (
+            not self.is_reversed and position is not None
+        )
+        return page
+
+    def get_paginated_response(self, data, query_params=None, **kwargs):
+        status = kwargs.get("status", 200)
+        response_data = {
+            **kwargs,
+            "next": self.get_next_link(self.parse_query_params()),
+            "previous": self.get_previous_link(self.parse_query_params()),
+            "data": data,
+        }
+        if self.approximate_count is not None:
+            response_data["approximate_count"] = self.approximate_count
+        return Response(response_data, status=status)
+
+    def get_next_link(self, query_params):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(query_params, self.page[-1], is_reversed=False)
+
+    def get_previous_link(self, query_params):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(query_params, self.page[0], is_reversed=True)
+
+    def build_link(self, query_params, instance, is_reversed):
+        url = self.host + self.url_suffix
+        if query_params:
+            url = f"{self.host}{self.url_suffix}?{query_params}"
+        cursor = self.encode_cursor(instance, is_reversed)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def encode_cursor(instance, is_reversed: bool) -> str:
+        position = [instance.created_at.isoformat(), instance.id, is_reversed]
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+        return cursor.decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str = None):
+        """ Returns the (created_at, id) position and direction of the cursor """
+        if not cursor:
+            return None, False
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            created_at, instance_id, is_reversed = json.loads(
+                base64.urlsafe_b64decode(cursor + padding)
+            )
+            created_at = parse_datetime(created_at)
+        except (TypeError, ValueError):
+            created_at = None
+        if created_at is None:
+            from rest_framework.exceptions import NotFound
+
+            raise NotFound(dict(error="The requested page does not exists", status=404))
+        return (created_at, instance_id), bool(is_reversed)
+
+    @staticmethod
+    def get_approximate_count(queryset) -> int:
+        """ Uses the planner's row estimate instead of a COUNT(*) on Postgres """
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return queryset.count()
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            query_plan = cursor.fetchone()[0]
+        if isinstance(query_plan, str):
+            query_plan = json.loads(query_plan)
+        return query_plan[0]["Plan"]["Plan Rows"]
+
+
 class SendEmail:
     from_email = settings.DEFAULT_FROM_EMAIL
 
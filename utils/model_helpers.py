@@ -1,18 +1,130 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from utils.constants import StateType
+import os
+import time
 import uuid
 
+UUID7_TIMESTAMP_BITS = 48
+UUID7_RANDOM_BITS = 80
+
 
 def generate_id():
-    return uuid.uuid4().hex
+    """
+    Time ordered UUIDv7 as 32 hex characters
+
+    Ids sort by creation time, so new rows are appended to the end of the
+    primary key index instead of splitting pages across all of it.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    random_bits = int.from_bytes(os.urandom(UUID7_RANDOM_BITS // 8), "big")
+    value = (timestamp_ms % (1 << UUID7_TIMESTAMP_BITS)) << UUID7_RANDOM_BITS
+    value |= random_bits
+    # Version 7 and the RFC 4122 variant
+    value = value & ~(0xF << 76) | (0x7 << 76)
+    value = value & ~(0x3 << 62) | (0x2 << 62)
+    return uuid.UUID(int=value).hex
+
+
+class CompactUUIDField(models.UUIDField):
+    """
+    UUID primary key that reads and writes ids as 32 hex characters
+
+    Ids are sent to the database as hex strings, which Postgres compares
+    against both the old varchar columns and native uuid columns. The code
+    can therefore be deployed before the migrations that change the column
+    type, and those can run later in a quiet window: changing the type
+    rewrites each table and its foreign keys under an ACCESS EXCLUSIVE lock.
+    Code still using the CharField must be gone before they run, as it
+    reads uuid columns back as UUID objects.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return value if value is None else value.hex
+
+    def get_prep_value(self, value):
+        try:
+            return self.to_python(value)
+        except ValidationError:
+            # Malformed ids can't have been stored, so lookups match nothing
+            return None
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return value
+
+
+def drop_referencing_like_indexes(*model_labels):
+    """
+    Migration step dropping the varchar pattern indexes of foreign keys
+
+    Postgres keeps a `_like` index next to every varchar foreign key. When
+    the referenced primary key becomes a uuid, Django alters the foreign
+    key columns too but leaves those indexes, which can't hold a uuid.
+    """
+
+    def drop_like_indexes(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return
+        for model_label in model_labels:
+            for relation in apps.get_model(model_label)._meta.related_objects:
+                if relation.many_to_many:
+                    continue
+                with connection.cursor() as cursor:
+                    constraints = connection.introspection.get_constraints(
+                        cursor, relation.related_model._meta.db_table
+                    )
+                for name, constraint in constraints.items():
+                    if (
+                        constraint["index"]
+                        and constraint["columns"] == [relation.field.column]
+                        and name.endswith("_like")
+                    ):
+                        schema_editor.execute(
+                            f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}"
+                        )
+
+    return drop_like_indexes
+
+
+def restore_hex_ids(*model_labels):
+    """
+    Reverse migration step turning ids back into 32 hex characters
+
+    Casting a uuid column back to varchar writes the dashed form, which
+    lookups with hex ids would no longer match.
+    """
+
+    def restore_ids(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        quote_name = schema_editor.quote_name
+        for model_label in model_labels:
+            model = apps.get_model(model_label)
+            id_columns = [(model._meta.db_table, model._meta.pk.column)] + [
+                (relation.related_model._meta.db_table, relation.field.column)
+                for relation in model._meta.related_objects
+                if not relation.many_to_many
+            ]
+            for table, column in id_columns:
+                schema_editor.execute(
+                    f"UPDATE {quote_name(table)} "
+                    f"SET {quote_name(column)} = replace({quote_name(column)}, '-', '')"
+                )
+
+    return restore_ids
 
 
 class BaseAbstractModel(models.Model):
     """ Base Abstract Model """
 
-    id = models.CharField(
-        max_length=60, primary_key=True, default=generate_id, editable=False
-    )
+    id = CompactUUIDField(primary_key=True, default=generate_id, editable=False)
     state = models.CharField(
         max_length=50,
         choices=[(state.name, state.value) for state in StateType],
@@ -0,0 +1,33 @@
+from django.db import models
+from rest_framework import serializers
+
+
+class BatchCacheListSerializer(serializers.ListSerializer):
+    """ Fetches the cached values of every row before the rows are serialized """
+
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.cached_values = self.child.fetch_cached_values(instances)
+        return super().to_representation(instances)
+
+
+class BatchCacheMixin:
+    """
+    Per-row cache lookups fetched for the whole page in one round trip
+
+    Serializers set `list_serializer_class = BatchCacheListSerializer` in
+    their Meta and implement `fetch_cached_values`, returning the values of
+    the given instances keyed by primary key. Rows then read their value
+    with `get_cached_value`.
+    """
+
+    cached_values = None
+
+    def fetch_cached_values(self, instances) -> dict:
+        raise NotImplementedError
+
+    def get_cached_value(self, instance):
+        # Serializing a single instance fetches just its own value
+        if self.cached_values is None or instance.pk not in self.cached_values:
+            return self.fetch_cached_values([instance]).get(instance.pk)
+        return self.cached_values[instance.pk]